@@ -0,0 +1,88 @@
+import asyncio
+import logging
+
+from events import event_type
+
+logger = logging.getLogger("api-rest")
+
+
+class Subscriber:
+    """Client connesso: coda limitata di eventi (id, tipo, dati JSON); None chiude lo stream."""
+
+    def __init__(self, queue_size):
+        self.queue = asyncio.Queue(queue_size)
+        self.dropped = False
+
+
+class EventBroadcaster:
+    """
+    Un'unica lettura del canale `events` per processo (un EventReader creato
+    da `reader_factory`), distribuita a tutti i client connessi. Ogni client
+    ha una coda di `queue_size` eventi: se è piena (client troppo lento) il
+    client viene disconnesso invece di rallentare gli altri o accumulare memoria.
+    """
+
+    def __init__(self, reader_factory, queue_size=100, on_drop=None):
+        self.reader_factory = reader_factory
+        self.queue_size = queue_size
+        self.on_drop = on_drop
+        self._subscribers = set()
+        self._task = None
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._relay())
+        subscriber = Subscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event_id, kind, data):
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait((event_id, kind, data))
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+
+    def _end(self, subscriber):
+        self._subscribers.discard(subscriber)
+        # Svuota la coda e lascia solo la chiusura: il client non riceverebbe comunque tutti gli eventi
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+    def _drop(self, subscriber):
+        subscriber.dropped = True
+        self._end(subscriber)
+        if self.on_drop:
+            self.on_drop()
+
+    async def _relay(self):
+        # Lo stesso reader è riaperto dopo un errore: con gli stream riprende dall'ultimo id ricevuto
+        reader = self.reader_factory()
+        while True:
+            try:
+                async with reader:
+                    while True:
+                        for event_id, data in await reader.read(timeout=1.0):
+                            self.publish(event_id, event_type(data), data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Event stream Redis error: {e}", extra={"request_id": ""})
+                await asyncio.sleep(1)
+
+    async def close(self):
+        for subscriber in list(self._subscribers):
+            self._end(subscriber)
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
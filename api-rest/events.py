@@ -0,0 +1,269 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger("api-rest")
+
+EVENTS_CHANNEL = "events"
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def event_type(data):
+    """Tipo di un messaggio JSON del canale `events` ("message" se assente o non valido)."""
+    try:
+        return json.loads(data).get("type", "message")
+    except (ValueError, AttributeError):
+        return "message"
+
+
+def stream_id_key(event_id):
+    """Id di un Redis Stream ("<ms>-<seq>") come tupla confrontabile."""
+    ms, _, seq = event_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class CircuitBreaker:
+    """
+    Dopo `failures` errori consecutivi il circuito si apre: per `reset_timeout`
+    secondi nessun tentativo verso Redis. Poi è consentito un tentativo di
+    prova: se riesce il circuito si richiude, altrimenti resta aperto.
+    """
+
+    def __init__(self, failures=3, reset_timeout=5.0):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self._errors = 0
+        self._opened_at = None
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def retry_in(self):
+        """Secondi mancanti al prossimo tentativo consentito (0 = si può tentare)."""
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def success(self):
+        self._errors = 0
+        self._opened_at = None
+
+    def failure(self):
+        self._errors += 1
+        if self._errors >= self.failures:
+            self._opened_at = time.monotonic()
+
+
+class EventPublisher:
+    """
+    Pubblica gli eventi (canale, messaggio) su Redis passando da un outbox in
+    memoria: un buffer circolare di `buffer_size` eventi svuotato da un solo
+    task in background, a blocchi di `batch_size` eventi per pipeline, nell'ordine
+    di arrivo. Gli eventi delle richieste concorrenti finiscono nella stessa pipeline.
+
+    Se Redis non risponde gli eventi restano nell'outbox (oltre `buffer_size`
+    si scartano i più vecchi) e il circuit breaker sospende i tentativi: le
+    richieste accodano e rispondono subito, senza attendere connessioni che
+    falliscono. Alla riapertura l'outbox viene svuotato.
+
+    Con transport="stream" i messaggi del canale `events` sono aggiunti al
+    Redis Stream `stream_key` (XADD con MAXLEN ~ `maxlen`) e restano
+    rileggibili dai consumer a partire dall'ultimo id visto; gli altri
+    canali (es. product-lowstock) restano pub/sub.
+
+    `on_depth(n)`, `on_drop(n)` e `on_flush(secondi)` ricevono profondità
+    dell'outbox, eventi scartati e durata di ogni invio (metriche).
+    """
+
+    def __init__(self, redis, transport="pubsub", stream_key="events:stream", maxlen=100000,
+                 buffer_size=10000, batch_size=500, breaker=None,
+                 on_depth=None, on_drop=None, on_flush=None):
+        self.redis = redis
+        self.transport = transport
+        self.stream_key = stream_key
+        self.maxlen = maxlen
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.breaker = breaker or CircuitBreaker()
+        self.on_depth = on_depth
+        self.on_drop = on_drop
+        self.on_flush = on_flush
+        self._buffer = deque()
+        # Eventi usciti dall'outbox (inviati o scartati) e accodati in totale
+        self._removed = 0
+        self._appended = 0
+        self._waiters = deque()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._buffer)
+
+    async def publish(self, events):
+        """
+        Accoda `events` e, se Redis è raggiungibile, attende che siano inviati
+        (gli errori sono solo registrati: gli eventi restano nell'outbox).
+        """
+        if not events:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._buffer.extend(events)
+        self._appended += len(events)
+        overflow = len(self._buffer) - self.buffer_size
+        if overflow > 0:
+            for _ in range(overflow):
+                self._buffer.popleft()
+            self._removed += overflow
+            if self.on_drop:
+                self.on_drop(overflow)
+        self._report_depth()
+        self._wakeup.set()
+        if self.breaker.is_open:
+            return
+        done = asyncio.get_running_loop().create_future()
+        self._waiters.append((self._appended, done))
+        await asyncio.shield(done)
+
+    def _report_depth(self):
+        if self.on_depth:
+            self.on_depth(len(self._buffer))
+
+    def _release(self, everyone=False):
+        while self._waiters and (everyone or self._waiters[0][0] <= self._removed):
+            _, done = self._waiters.popleft()
+            if not done.done():
+                done.set_result(None)
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._buffer:
+                delay = self.breaker.retry_in()
+                if delay:
+                    await asyncio.sleep(delay)
+                    continue
+                await self.flush_once()
+
+    async def flush_once(self):
+        """Invia il blocco più vecchio dell'outbox; restituisce False se Redis non risponde."""
+        first = self._removed
+        items = [self._buffer[i] for i in range(min(self.batch_size, len(self._buffer)))]
+        start = time.perf_counter()
+        try:
+            await self.send(items)
+        except Exception as e:
+            was_open = self.breaker.is_open
+            self.breaker.failure()
+            if self.breaker.is_open and not was_open:
+                logger.error(f"Redis publish error, circuit open ({len(self._buffer)} events buffered): {e}",
+                             extra={"request_id": ""})
+            elif not self.breaker.is_open:
+                logger.error(f"Redis publish error ({len(items)} events): {e}", extra={"request_id": ""})
+            # Chi attende non resta bloccato: i suoi eventi saranno inviati alla riconnessione
+            self._release(everyone=True)
+            return False
+        if self.on_flush:
+            self.on_flush(time.perf_counter() - start)
+        self.breaker.success()
+        # Durante l'invio l'outbox può aver scartato in testa alcuni degli eventi inviati
+        sent = max(0, first + len(items) - self._removed)
+        for _ in range(sent):
+            self._buffer.popleft()
+        self._removed += sent
+        self._report_depth()
+        self._release()
+        return True
+
+    async def send(self, items):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for channel, message in items:
+                if self.transport == "stream" and channel == EVENTS_CHANNEL:
+                    pipe.xadd(self.stream_key, {"data": message}, maxlen=self.maxlen, approximate=True)
+                else:
+                    pipe.publish(channel, message)
+            await pipe.execute()
+
+    async def close(self, timeout=1.0):
+        """Ultimo tentativo di svuotare l'outbox (al massimo `timeout` secondi), poi ferma il flusher."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        try:
+            async with asyncio.timeout(timeout):
+                while self._buffer and not self.breaker.is_open and await self.flush_once():
+                    pass
+        except TimeoutError:
+            pass
+        if self._buffer:
+            logger.error(f"{len(self._buffer)} events lost at shutdown", extra={"request_id": ""})
+        self._release(everyone=True)
+
+
+class EventReader:
+    """
+    Legge a blocchi i messaggi del canale `events`, da pub/sub oppure (con
+    transport="stream") dal Redis Stream a partire da `last_id` ("$" = solo
+    i nuovi). In modalità stream `last_id` avanza a ogni lettura: riaprendo lo
+    stesso reader dopo un errore si riprende dal punto in cui ci si era fermati.
+
+    Le letture bloccano fino a `timeout` secondi: il client Redis non deve
+    avere un socket_timeout più breve.
+    """
+
+    def __init__(self, redis, transport="pubsub", channel=EVENTS_CHANNEL, stream_key="events:stream", last_id="$"):
+        self.redis = redis
+        self.transport = transport
+        self.channel = channel
+        self.stream_key = stream_key
+        self.last_id = last_id
+        self._pubsub = None
+
+    async def __aenter__(self):
+        if self.transport == "stream":
+            if self.last_id == "$":
+                last = await self.redis.xrevrange(self.stream_key, count=1)
+                self.last_id = _text(last[0][0]) if last else "0-0"
+        else:
+            self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            await self._pubsub.subscribe(self.channel)
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+
+    async def read(self, timeout=1.0, count=100):
+        """Messaggi disponibili [(id, dati)], al massimo `count` (id None con pub/sub)."""
+        messages = []
+        if self.transport == "stream":
+            response = await self.redis.xread({self.stream_key: self.last_id}, count=count, block=int(timeout * 1000))
+            for _, entries in response or ():
+                for event_id, fields in entries:
+                    self.last_id = _text(event_id)
+                    messages.append((self.last_id, _text(fields.get(b"data", fields.get("data")))))
+            return messages
+        message = await self._pubsub.get_message(timeout=timeout)
+        while message is not None:
+            messages.append((None, _text(message["data"])))
+            if len(messages) >= count:
+                break
+            message = await self._pubsub.get_message(timeout=0)
+        return messages
+
+
+async def read_since(redis, stream_key, last_id, count):
+    """Messaggi dello stream successivi a `last_id` (escluso), al massimo `count`."""
+    entries = await redis.xrange(stream_key, min="(" + last_id, max="+", count=count)
+    return [(_text(event_id), _text(fields.get(b"data", fields.get("data")))) for event_id, fields in entries]
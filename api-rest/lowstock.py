@@ -0,0 +1,59 @@
+class LowStockMonitor:
+    """
+    Stato "scorta bassa" per prodotto, con isteresi: un prodotto entra in
+    scorta bassa quando lo stock scende a `threshold` o meno e ne esce solo
+    quando supera `threshold + band`. L'avviso va pubblicato solo all'ingresso,
+    non a ogni modifica di un prodotto già sotto soglia.
+
+    `categories` contiene soglia e banda per categoria ({categoria: (soglia, banda)}),
+    le altre categorie usano `threshold` e `band`. Lo stato va inizializzato con
+    `load` dal catalogo corrente (all'avvio, dopo un reset o un ricaricamento):
+    un prodotto già sotto soglia non genera l'avviso finché non risale oltre la banda.
+
+    Lo stato è del processo: con più worker ognuno vede solo gli aggiornamenti
+    che esegue, quindi un prodotto portato sotto soglia da un worker può generare
+    l'avviso anche da un altro worker al suo primo aggiornamento sotto soglia.
+    """
+
+    def __init__(self, threshold=25, band=5, categories=None):
+        self.threshold = threshold
+        self.band = band
+        self.categories = categories or {}
+        self._low = set()
+
+    def limits(self, category):
+        return self.categories.get(category, (self.threshold, self.band))
+
+    def observe(self, pid, category, stock):
+        """
+        Registra il nuovo stock del prodotto; restituisce True se è appena entrato
+        in scorta bassa, False se era già sotto soglia, None se è sopra soglia.
+        """
+        threshold, band = self.limits(category)
+        if stock <= threshold:
+            if pid in self._low:
+                return False
+            self._low.add(pid)
+            return True
+        if stock > threshold + band:
+            self._low.discard(pid)
+        return None
+
+    def load(self, products):
+        """Riparte dallo stock attuale di `products`: sono in scorta bassa quelli a soglia o meno."""
+        self._low = {p.id for p in products if p.stock <= self.limits(p.category)[0]}
+
+
+def parse_categories(spec, band):
+    """Soglie per categoria da "categoria=soglia[:banda],..." (es. "laptop=5:2,accessories=50"); `band` se assente."""
+    categories = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        category, sep, limits = item.partition("=")
+        threshold, _, category_band = limits.partition(":")
+        try:
+            if not sep or not category.strip():
+                raise ValueError(item)
+            categories[category.strip()] = (int(threshold), int(category_band) if category_band else band)
+        except ValueError:
+            raise RuntimeError(f"Soglia di scorta bassa non valida: {item!r} (atteso categoria=soglia[:banda])")
+    return categories
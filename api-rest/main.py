@@ -1,18 +1,69 @@
-from fastapi import FastAPI, HTTPException, Request, Depends
-from fastapi.responses import Response
+from fastapi import FastAPI, HTTPException, Request, Depends, Query
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.datastructures import Headers, MutableHeaders
 from pydantic import BaseModel
 from typing import List, Optional
-import uvicorn, os, json, redis, time, logging, sys, uuid
+import uvicorn, asyncio, os, json, time, logging, sys, uuid, hashlib, queue, random, glob, tempfile
+from logging.handlers import QueueHandler, QueueListener
+import redis.asyncio as aioredis
+import orjson
+from collections import OrderedDict
 from contextvars import ContextVar
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from functools import lru_cache
+from operator import attrgetter
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, multiprocess, generate_latest, CONTENT_TYPE_LATEST
 from pythonjsonlogger import jsonlogger
+from store import InvalidSort, ProductStore
+from broadcast import EventBroadcaster
+from lowstock import LowStockMonitor, parse_categories
+from events import CircuitBreaker, EventPublisher, EventReader, event_type, read_since, stream_id_key
+from shared_store import SharedCatalog
+from persistence import MemoryBackend, WalBackend, PostgresBackend, open_store
+from ratelimit import Limiter, RateLimitExceeded, rate_limit_exceeded_handler, get_remote_address
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 RATE_LIMIT = os.getenv("RATE_LIMIT", "100/minute")
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", "20"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "1.0"))
+REDIS_COMMAND_TIMEOUT = float(os.getenv("REDIS_COMMAND_TIMEOUT", "0.5"))
+BATCH_UPDATE_EVENTS = os.getenv("BATCH_UPDATE_EVENTS", "false").lower() == "true"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", "500"))
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "100"))
+# Dimensione del catalogo per i benchmark: oltre i 20 prodotti base si aggiungono prodotti sintetici
+CATALOG_SIZE = int(os.getenv("CATALOG_SIZE", "20"))
+CHANGE_LOG_SIZE = int(os.getenv("CHANGE_LOG_SIZE", "10000"))
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "100"))
+SSE_KEEPALIVE = float(os.getenv("SSE_KEEPALIVE", "15"))
+SSE_REPLAY_LIMIT = int(os.getenv("SSE_REPLAY_LIMIT", "1000"))
+# Trasporto degli eventi del catalogo: pubsub (fire-and-forget) o stream (Redis Stream rileggibile)
+EVENTS_TRANSPORT = os.getenv("EVENTS_TRANSPORT", "pubsub")
+EVENTS_STREAM = os.getenv("EVENTS_STREAM", "events:stream")
+EVENTS_STREAM_MAXLEN = int(os.getenv("EVENTS_STREAM_MAXLEN", "100000"))
+# Outbox degli eventi: buffer in memoria mentre Redis non è raggiungibile
+EVENTS_OUTBOX_SIZE = int(os.getenv("EVENTS_OUTBOX_SIZE", "10000"))
+EVENTS_FLUSH_BATCH = int(os.getenv("EVENTS_FLUSH_BATCH", "500"))
+REDIS_BREAKER_FAILURES = int(os.getenv("REDIS_BREAKER_FAILURES", "3"))
+REDIS_BREAKER_RESET = float(os.getenv("REDIS_BREAKER_RESET", "5.0"))
+RATE_LIMIT_LOCAL_FRACTION = float(os.getenv("RATE_LIMIT_LOCAL_FRACTION", "0.1"))
+LOG_START_SAMPLE_RATE = float(os.getenv("LOG_START_SAMPLE_RATE", "1.0"))
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+PORT = int(os.getenv("PORT", "8080"))
+# Con più worker il catalogo deve stare in Redis, altrimenti ogni processo avrebbe il proprio
+SHARED_CATALOG = os.getenv("SHARED_CATALOG", str(API_WORKERS > 1)).lower() == "true"
+# Persistenza del catalogo: memory (nessuna), wal (snapshot + WAL locale), postgres
+USE_POSTGRES = os.getenv("USE_POSTGRES", "false").lower() == "true"
+STORE_BACKEND = os.getenv("STORE_BACKEND", "postgres" if USE_POSTGRES else "memory")
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+WAL_DIR = os.getenv("WAL_DIR", "data")
+WAL_SNAPSHOT_EVERY = int(os.getenv("WAL_SNAPSHOT_EVERY", "10000"))
+WAL_FSYNC = os.getenv("WAL_FSYNC", "false").lower() == "true"
+# Scorta bassa: avviso all'ingresso sotto soglia, di nuovo solo dopo essere risaliti oltre soglia + banda
+LOW_STOCK_THRESHOLD = int(os.getenv("LOW_STOCK_THRESHOLD", "25"))
+LOW_STOCK_HYSTERESIS = int(os.getenv("LOW_STOCK_HYSTERESIS", "5"))
+LOW_STOCK_CATEGORIES = parse_categories(os.getenv("LOW_STOCK_CATEGORIES", ""), LOW_STOCK_HYSTERESIS)
 #RATE_LIMIT = "10/minute"  # override temporaneo per test
 
 request_id_ctx: ContextVar[str] = ContextVar("request_id", default="")
@@ -23,16 +74,63 @@ formatter = jsonlogger.JsonFormatter(
     "%(asctime)s %(name)s %(levelname)s %(message)s %(request_id)s %(trace_id)s"
 )
 logHandler.setFormatter(formatter)
-logger.addHandler(logHandler)
+# I record passano da una coda: formattazione JSON e scrittura su stdout avvengono nel thread del listener
+log_queue = queue.SimpleQueue()
+logger.addHandler(QueueHandler(log_queue))
 logger.setLevel(logging.INFO)
+log_listener = QueueListener(log_queue, logHandler)
+log_listener.start()
 
-r = redis.Redis. from_url(REDIS_URL)
+# Pool limitato: oltre REDIS_POOL_SIZE connessioni le richieste attendono al massimo REDIS_COMMAND_TIMEOUT
+redis_pool = aioredis.BlockingConnectionPool.from_url(
+    REDIS_URL,
+    max_connections=REDIS_POOL_SIZE,
+    timeout=REDIS_COMMAND_TIMEOUT,
+    socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+    socket_timeout=REDIS_COMMAND_TIMEOUT,
+)
+r = aioredis.Redis(connection_pool=redis_pool)
+# Client separato per le letture bloccanti degli eventi (XREAD BLOCK / pub/sub): senza socket_timeout
+events_redis = aioredis.from_url(REDIS_URL, socket_connect_timeout=REDIS_CONNECT_TIMEOUT)
+
+def event_reader(last_id="$"):
+    return EventReader(events_redis, EVENTS_TRANSPORT, stream_key=EVENTS_STREAM, last_id=last_id)
 
-limiter = Limiter(key_func=get_remote_address)
+# Stato di Redis visto da rate limiter e outbox degli eventi: gli errori di uno evitano i timeout dell'altro
+redis_breaker = CircuitBreaker(REDIS_BREAKER_FAILURES, REDIS_BREAKER_RESET)
+
+# Limiti per client e per endpoint, condivisi tra i worker tramite Redis
+limiter = Limiter(r, key_func=get_remote_address, local_fraction=RATE_LIMIT_LOCAL_FRACTION, breaker=redis_breaker)
 
 REQUEST_COUNT = Counter("api_rest_requests_total", "Total requests", ["method", "endpoint", "status"])
 REQUEST_LATENCY = Histogram("api_rest_request_duration_seconds", "Request latency", ["method", "endpoint"])
 ERROR_COUNT = Counter("api_rest_errors_total", "Total errors", ["endpoint"])
+SSE_CLIENTS = Gauge("api_rest_sse_clients", "Connected SSE clients", multiprocess_mode="livesum")
+SSE_DROPPED = Counter("api_rest_sse_dropped_total", "SSE clients dropped for falling behind")
+LOW_STOCK_ALERTS = Counter("api_rest_lowstock_alerts_total", "Low-stock alerts by outcome", ["result"])
+EVENTS_OUTBOX_DEPTH = Gauge("api_rest_events_outbox_depth", "Events waiting in the outbox", multiprocess_mode="livesum")
+EVENTS_DROPPED = Counter("api_rest_events_dropped_total", "Events dropped because the outbox was full")
+EVENTS_FLUSH_LATENCY = Histogram("api_rest_events_flush_seconds", "Duration of an outbox flush to Redis")
+
+event_publisher = EventPublisher(
+    r,
+    EVENTS_TRANSPORT,
+    stream_key=EVENTS_STREAM,
+    maxlen=EVENTS_STREAM_MAXLEN,
+    buffer_size=EVENTS_OUTBOX_SIZE,
+    batch_size=EVENTS_FLUSH_BATCH,
+    breaker=redis_breaker,
+    on_depth=EVENTS_OUTBOX_DEPTH.set,
+    on_drop=EVENTS_DROPPED.inc,
+    on_flush=EVENTS_FLUSH_LATENCY.observe,
+)
+# Label per le richieste che non corrispondono a nessuna route (404, scansioni...)
+UNMATCHED_ROUTE = "<unmatched>"
+
+def route_label(scope):
+    """Template della route che ha gestito la richiesta (es. /products/{pid}), non il path reale."""
+    route = scope.get("route")
+    return route.path if route is not None else UNMATCHED_ROUTE
 
 
 app = FastAPI(title="API REST - Catalog/Orders/Users")
@@ -45,7 +143,21 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
+
+@app.on_event("shutdown")
+async def close_redis():
+    if shared_catalog:
+        await shared_catalog.stop()
+    await storage.close()
+    await event_broadcaster.close()
+    await event_publisher.close()
+    await events_redis.aclose()
+    await r.aclose()
+    await redis_pool.aclose()
+    log_listener.stop()
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
 
 class Product(BaseModel):
     id: int
@@ -78,135 +190,490 @@ BASE_PRODUCTS = {
     20: {"id": 20, "name":  "Action Cam", "price":  299.0, "stock":  65, "category": "camera", "description": "4K action camera"},
 }
 
-DB_PRODUCTS = {k: Product(**v) for k, v in BASE_PRODUCTS.items()}
-
-@app.middleware("http")
-async def logging_middleware(request: Request, call_next):
-    request_id = request. headers.get("X-Request-ID", str(uuid.uuid4()))
-    trace_id = request.headers.get("X-Trace-ID", request_id)
-    request_id_ctx.set(request_id)
-    
-    start_time = time.time()
-    method = request.method
-    path = request.url.path
-    
-    logger.info(
-        "Request started",
-        extra={
-            "request_id": request_id,
-            "trace_id": trace_id,
-            "method": method,
-            "path": path,
-        }
-    )
-    
+low_stock = LowStockMonitor(LOW_STOCK_THRESHOLD, LOW_STOCK_HYSTERESIS, LOW_STOCK_CATEGORIES)
+def base_price(pid):
+    """Prezzo di `pid` nel catalogo iniziale (quello ripristinato da /reset); None se l'id non esiste."""
+    if pid in BASE_PRODUCTS:
+        return BASE_PRODUCTS[pid]["price"]
+    if len(BASE_PRODUCTS) < pid <= CATALOG_SIZE:
+        return float(10 + pid % 990)
+    return None
+
+def base_products():
+    """Catalogo iniziale: i prodotti di BASE_PRODUCTS, completati con prodotti sintetici fino a CATALOG_SIZE."""
+    products = [Product(**v) for v in BASE_PRODUCTS.values()]
+    for pid in range(len(BASE_PRODUCTS) + 1, CATALOG_SIZE + 1):
+        products.append(Product(
+            id=pid,
+            name=f"Product {pid}",
+            price=base_price(pid),
+            stock=pid % 300,
+            category=f"category-{pid % 50}",
+            description=f"Synthetic product {pid}",
+        ))
+    return products
+
+DB_PRODUCTS = ProductStore(base_products(), change_log_size=CHANGE_LOG_SIZE)
+shared_catalog = (
+    SharedCatalog(r, DB_PRODUCTS, Product, event_reader, event_publisher, on_load=low_stock.load)
+    if SHARED_CATALOG else None
+)
+
+def create_storage():
+    if STORE_BACKEND == "memory":
+        return MemoryBackend()
+    if STORE_BACKEND == "wal":
+        if API_WORKERS > 1:
+            raise RuntimeError("STORE_BACKEND=wal è locale al processo: con più worker usare postgres")
+        return WalBackend(WAL_DIR, DB_PRODUCTS, Product, snapshot_every=WAL_SNAPSHOT_EVERY, fsync=WAL_FSYNC)
+    if STORE_BACKEND == "postgres":
+        return PostgresBackend(DATABASE_URL, Product, pool_size=DB_POOL_SIZE)
+    raise RuntimeError(f"STORE_BACKEND non valido: {STORE_BACKEND}")
+
+storage = create_storage()
+
+@app.on_event("startup")
+async def start_catalog():
+    if STORE_BACKEND != "memory":
+        await open_store(DB_PRODUCTS, storage, base_products())
+    # Prodotti già sotto soglia all'avvio: nessun avviso finché non risalgono oltre la banda
+    low_stock.load(DB_PRODUCTS.values())
+    if shared_catalog:
+        await shared_catalog.start(list(DB_PRODUCTS.values()))
+
+async def apply_updates(updates):
+    """
+    Applica le modifiche [(pid, stock, price)] al catalogo; restituisce i
+    prodotti aggiornati (None per gli id inesistenti). Le modifiche sono prima
+    rese persistenti dal backend e poi, in modalità condivisa, scritte su Redis.
+    Se il backend non risponde la richiesta fallisce senza modificare nulla; se
+    non risponde Redis (503) le modifiche restano salvate nel backend ma non
+    arrivano al catalogo servito finché il client non ripete la richiesta
+    (i valori sono assoluti, ripeterla è sicuro).
+    """
     try:
-        response = await call_next(request)
+        await storage.write([u for u in updates if u[0] in DB_PRODUCTS])
+    except Exception as e:
+        logger.error(f"Storage write error: {e}", extra={"request_id": request_id_ctx.get()})
+        raise HTTPException(503, "Archivio prodotti non disponibile")
+    if shared_catalog is None:
+        return [DB_PRODUCTS.update(pid, stock=stock, price=price) for pid, stock, price in updates]
+    try:
+        return await shared_catalog.write(updates)
+    except Exception as e:
+        logger.error(f"Shared catalog write error: {e}", extra={"request_id": request_id_ctx.get()})
+        raise HTTPException(503, "Catalogo condiviso non disponibile")
+
+
+class ResponseCache:
+    """
+    Corpi JSON già serializzati per (path, query), validi finché la versione
+    del catalogo (globale o del singolo prodotto) da cui derivano non cambia.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def get(self, key, version):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1], entry[2]
+
+    def put(self, key, version, body):
+        etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self._entries[key] = (version, body, etag)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return body, etag
+
+
+RESPONSE_CACHE = ResponseCache(RESPONSE_CACHE_SIZE)
+
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or any(t.removeprefix("W/") == etag for t in tags)
+
+
+PRODUCT_FIELDS = tuple(Product.model_fields)
+
+
+def parse_fields(fields):
+    """Campi richiesti con ?fields=a,b (ordine canonico di Product); None = tutti."""
+    if not fields:
+        return PRODUCT_FIELDS
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested.difference(PRODUCT_FIELDS)
+    if unknown:
+        raise HTTPException(400, f"Campi non validi: {', '.join(sorted(unknown))}")
+    return tuple(f for f in PRODUCT_FIELDS if f in requested)
+
+
+@lru_cache(maxsize=64)
+def product_projector(fields):
+    """Serializzatore precompilato di una proiezione: legge gli attributi senza passare da model_dump."""
+    getter = attrgetter(*fields)
+    if len(fields) == 1:
+        name = fields[0]
+        return lambda p: {name: getter(p)}
+    return lambda p: dict(zip(fields, getter(p)))
+
+
+# Serializzatore Rust di pydantic-core: codifica un Product già validato senza rivalidarlo
+PRODUCT_SERIALIZER = Product.__pydantic_serializer__
+
+# Frammenti JSON per prodotto (tutti i campi), riutilizzati finché la versione del prodotto non cambia
+ENCODED_PRODUCTS = {}
+
+
+def encode_product(p):
+    version = DB_PRODUCTS.product_version(p.id)
+    entry = ENCODED_PRODUCTS.get(p.id)
+    if entry is None or entry[0] != version:
+        entry = ENCODED_PRODUCTS[p.id] = (version, PRODUCT_SERIALIZER.to_json(p))
+    return entry[1]
+
+
+def encode_products(items, fields=PRODUCT_FIELDS):
+    """
+    Corpo JSON di una lista di prodotti già validati, senza ripassare da
+    response_model. Byte per byte uguale all'output di FastAPI (JSON compatto, UTF-8).
+    """
+    if fields == PRODUCT_FIELDS:
+        return b"[" + b",".join([encode_product(p) for p in items]) + b"]"
+    project = product_projector(fields)
+    return orjson.dumps([project(p) for p in items])
+
+
+def cached_response(request: Request, version, build):
+    """
+    Risposta JSON per `request` dalla cache versionata; `build()` produce il
+    corpo (bytes) solo se manca o è obsoleto. Con If-None-Match corrispondente
+    restituisce 304.
+    """
+    key = (request.url.path, request.url.query)
+    hit = RESPONSE_CACHE.get(key, version)
+    if hit is None:
+        hit = RESPONSE_CACHE.put(key, version, build())
+    body, etag = hit
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+class RequestLoggingMiddleware:
+    """
+    Middleware ASGI puro per request/trace id, log JSON e metriche Prometheus.
+    Non incapsula lo stream di risposta: aggiunge solo gli header X-Request-ID
+    e X-Trace-ID al messaggio http.response.start. Il log "Request started"
+    viene campionato con probabilità `start_sample_rate`.
+    """
+
+    def __init__(self, app, start_sample_rate=LOG_START_SAMPLE_RATE):
+        self.app = app
+        self.start_sample_rate = start_sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        request_id = headers.get("x-request-id") or str(uuid.uuid4())
+        trace_id = headers.get("x-trace-id", request_id)
+        request_id_ctx.set(request_id)
+
+        start_time = time.time()
+        method = scope["method"]
+        path = scope["path"]
+        status = 500
+
+        if self.start_sample_rate >= 1 or random.random() < self.start_sample_rate:
+            logger.info(
+                "Request started",
+                extra={
+                    "request_id": request_id,
+                    "trace_id": trace_id,
+                    "method": method,
+                    "path": path,
+                }
+            )
+
+        async def send_with_ids(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = MutableHeaders(scope=message)
+                response_headers["X-Request-ID"] = request_id
+                response_headers["X-Trace-ID"] = trace_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_ids)
+        except Exception as e:
+            ERROR_COUNT.labels(endpoint=route_label(scope)).inc()
+            logger.error(
+                f"Request failed:  {str(e)}",
+                extra={
+                    "request_id": request_id,
+                    "trace_id": trace_id,
+                    "method": method,
+                    "path": path,
+                }
+            )
+            raise
         duration = time.time() - start_time
-        
-        REQUEST_COUNT.labels(method=method, endpoint=path, status=response.status_code).inc()
-        REQUEST_LATENCY. labels(method=method, endpoint=path).observe(duration)
-        
+
+        endpoint = route_label(scope)
+        REQUEST_COUNT.labels(method=method, endpoint=endpoint, status=status).inc()
+        REQUEST_LATENCY.labels(method=method, endpoint=endpoint).observe(duration)
+
         logger.info(
             "Request completed",
-            extra={
-                "request_id": request_id,
-                "trace_id": trace_id,
-                "method":  method,
-                "path": path,
-                "status":  response.status_code,
-                "duration_ms": round(duration * 1000, 2),
-            }
-        )
-        
-        response.headers["X-Request-ID"] = request_id
-        response.headers["X-Trace-ID"] = trace_id
-        return response
-    except Exception as e:
-        ERROR_COUNT.labels(endpoint=path).inc()
-        logger.error(
-            f"Request failed:  {str(e)}",
             extra={
                 "request_id": request_id,
                 "trace_id": trace_id,
                 "method": method,
                 "path": path,
+                "status": status,
+                "duration_ms": round(duration * 1000, 2),
             }
         )
-        raise
+
+app.add_middleware(RequestLoggingMiddleware)
 
 @app.get("/health")
 async def health_check():
     try:
-        r.ping()
+        await r.ping()
         return {"status": "healthy", "redis": "connected"}
     except Exception as e:
         return {"status": "degraded", "redis": "disconnected", "error": str(e)}
 
 @app.get("/metrics")
 async def metrics():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Con più worker ogni processo scrive le proprie metriche su file: lo scrape le aggrega
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.post("/reset")
 @limiter.limit(RATE_LIMIT)
 async def reset_products(request: Request):
-    global DB_PRODUCTS
-    DB_PRODUCTS = {k: Product(**v) for k, v in BASE_PRODUCTS.items()}
+    products = base_products()
+    try:
+        await storage.reset(products)
+    except Exception as e:
+        logger.error(f"Storage reset error: {e}", extra={"request_id": request_id_ctx.get()})
+        raise HTTPException(503, "Archivio prodotti non disponibile")
+    if shared_catalog:
+        try:
+            await shared_catalog.reset(products)
+        except Exception as e:
+            logger.error(f"Shared catalog reset error: {e}", extra={"request_id": request_id_ctx.get()})
+            raise HTTPException(503, "Catalogo condiviso non disponibile")
+    else:
+        DB_PRODUCTS.load(products)
+        low_stock.load(products)
     logger.info("All products reset to base values", extra={"request_id": request_id_ctx.get()})
     return {"message": "All products reset to base values", "count": len(DB_PRODUCTS)}
 
 @app.get("/products", response_model=List[Product])
 @limiter.limit(RATE_LIMIT)
-async def list_products(request: Request, limit: int | None = None, category: str | None = None):
-    items = list(DB_PRODUCTS.values())
-    if category:
-        items = [p for p in items if p.category == category]
-    if limit:
-        items = items[:limit]
-    return items
+async def list_products(
+    request: Request,
+    limit: int | None = Query(None, ge=0),
+    category: str | None = None,
+    min_stock: int | None = None,
+    max_stock: int | None = None,
+    min_price: float | None = None,
+    max_price: float | None = None,
+    sort: str | None = None,
+    fields: str | None = None,
+):
+    selected = parse_fields(fields)
+
+    def build():
+        items = DB_PRODUCTS.query(
+            category=category or None,
+            min_stock=min_stock,
+            max_stock=max_stock,
+            min_price=min_price,
+            max_price=max_price,
+            sort=sort,
+            limit=limit or None,
+        )
+        return encode_products(items, selected)
+
+    try:
+        return cached_response(request, DB_PRODUCTS.version, build)
+    except InvalidSort as e:
+        raise HTTPException(400, str(e))
+
+@app.get("/products/changes")
+@limiter.limit(RATE_LIMIT)
+async def get_product_changes(request: Request, since: int = 0, epoch: str | None = None, fields: str | None = None):
+    """
+    Modifiche al catalogo dopo la versione `since`: {"seq", "epoch", "resync", "changes"}.
+    Il client ripassa `seq` ed `epoch` come `since` ed `epoch` alla richiesta successiva;
+    con "resync": true (change log troncato, reset o epoch diversa) deve riscaricare /products.
+    """
+    selected = parse_fields(fields)
+
+    def build():
+        changed = DB_PRODUCTS.changes_since(since) if epoch in (None, DB_PRODUCTS.epoch) else None
+        head = orjson.dumps({"seq": DB_PRODUCTS.version, "epoch": DB_PRODUCTS.epoch, "resync": changed is None})
+        return head[:-1] + b',"changes":' + encode_products(changed or [], selected) + b"}"
+
+    return cached_response(request, DB_PRODUCTS.version, build)
+
+@app.get("/products/search", response_model=List[Product])
+@limiter.limit(RATE_LIMIT)
+async def search_products(request: Request, q: str, limit: int = 20, fields: str | None = None):
+    """
+    Ricerca full-text su name, category e description, per rilevanza: tutti i
+    termini devono corrispondere, anche come prefisso (es. ?q=wireless mou).
+    """
+    if not 1 <= limit <= SEARCH_MAX_LIMIT:
+        raise HTTPException(400, f"limit deve essere tra 1 e {SEARCH_MAX_LIMIT}")
+    selected = parse_fields(fields)
+    # La prima ricerca dopo un caricamento costruisce l'indice: fuori dall'event loop
+    if DB_PRODUCTS.search_ready:
+        index = DB_PRODUCTS.search_index()
+    else:
+        index = await asyncio.to_thread(DB_PRODUCTS.search_index)
+    return cached_response(request, DB_PRODUCTS.version, lambda: encode_products(index.search(q, limit), selected))
+
+def encode_batch(ids, recommendations, fields):
+    """
+    Corpo di /products:batch: prodotti nell'ordine richiesto (id duplicati
+    ignorati), eventualmente con le raccomandazioni incorporate, e id mancanti.
+    """
+    if len(ids) > BATCH_MAX_IDS:
+        raise HTTPException(400, f"Massimo {BATCH_MAX_IDS} id per richiesta")
+    ids = list(dict.fromkeys(ids))
+    found = [DB_PRODUCTS.get(pid) for pid in ids if pid in DB_PRODUCTS]
+    missing = [pid for pid in ids if pid not in DB_PRODUCTS]
+    if recommendations <= 0:
+        products = encode_products(found, fields)
+    else:
+        project = product_projector(fields)
+        products = orjson.dumps([
+            {**project(p), "recommendations": [project(r) for r in DB_PRODUCTS.recommendations(p.id, recommendations)]}
+            for p in found
+        ])
+    return b'{"products":' + products + b',"missing":' + orjson.dumps(missing) + b"}"
+
+
+class ProductBatchRequest(BaseModel):
+    ids: List[int]
+    recommendations: int = 0
+    fields: Optional[str] = None
+
+@app.get("/products:batch")
+@limiter.limit(RATE_LIMIT)
+async def get_products_batch(request: Request, ids: str, recommendations: int = 0, fields: str | None = None):
+    """
+    Lettura di più prodotti in un solo round trip (e un solo addebito di rate limit):
+    GET /products:batch?ids=1,2,3&recommendations=3&fields=id,name,price
+    """
+    try:
+        pids = [int(pid) for pid in ids.split(",") if pid.strip()]
+    except ValueError:
+        raise HTTPException(400, "ids deve essere una lista di interi separati da virgola")
+    selected = parse_fields(fields)
+    return cached_response(request, DB_PRODUCTS.version, lambda: encode_batch(pids, recommendations, selected))
+
+@app.post("/products:batch")
+@limiter.limit(RATE_LIMIT)
+async def post_products_batch(request: Request, batch: ProductBatchRequest):
+    """Come GET /products:batch, per liste di id troppo lunghe per la query string."""
+    body = encode_batch(batch.ids, batch.recommendations, parse_fields(batch.fields))
+    return Response(content=body, media_type="application/json")
+
+class BasePricesRequest(BaseModel):
+    ids: List[int]
+
+@app.post("/products:base-prices")
+@limiter.limit(RATE_LIMIT)
+async def post_base_prices(request: Request, body: BasePricesRequest):
+    """
+    Prezzi base degli id richiesti, {"id": prezzo} (id inesistenti omessi): i tool MCP
+    li usano per riconoscere un prodotto già scontato anche fuori dai 20 prodotti base.
+    """
+    if len(body.ids) > BATCH_MAX_IDS:
+        raise HTTPException(400, f"Massimo {BATCH_MAX_IDS} id per richiesta")
+    prices = ((pid, base_price(pid)) for pid in body.ids)
+    return {str(pid): price for pid, price in prices if price is not None}
 
 @app.get("/products/{pid}", response_model=Product)
 @limiter.limit(RATE_LIMIT)
-async def get_product(request: Request, pid: int):
+async def get_product(request: Request, pid: int, fields: str | None = None):
+    selected = parse_fields(fields)
     p = DB_PRODUCTS.get(pid)
     if not p:
         raise HTTPException(404, "Not found")
-    return p
+    if selected == PRODUCT_FIELDS:
+        build = lambda: encode_product(p)
+    else:
+        build = lambda: orjson.dumps(product_projector(selected)(p))
+    return cached_response(request, DB_PRODUCTS.product_version(pid), build)
 
 @app.get("/products/{pid}/recommendations", response_model=List[Product])
 @limiter.limit(RATE_LIMIT)
-async def get_recommendations(request: Request, pid: int, limit: int = 3):
+async def get_recommendations(request: Request, pid: int, limit: int = Query(3, ge=0), fields: str | None = None):
+    selected = parse_fields(fields)
     if pid not in DB_PRODUCTS:
         raise HTTPException(404, "Not found")
-    category = DB_PRODUCTS[pid].category
-    items = [p for p in DB_PRODUCTS.values() if p.id != pid and p.category == category]
-    if len(items) < limit:
-        others = [p for p in DB_PRODUCTS.values() if p.id != pid and p not in items]
-        items = (items + others)[:limit]
-    return items[:limit]
+    return cached_response(
+        request,
+        DB_PRODUCTS.version,
+        lambda: encode_products(DB_PRODUCTS.recommendations(pid, limit), selected),
+    )
+
+
+def product_events(p, stock=None, price=None):
+    """
+    Eventi Redis (canale, messaggio) generati dalla modifica del prodotto `p`.
+    L'avviso su product-lowstock parte solo quando il prodotto entra in scorta bassa.
+    """
+    pid = p.id
+    events = []
+    if stock is not None:
+        events.append(("events", json.dumps({"type": "stock_update", "id": pid, "stock": stock})))
+        entered = low_stock.observe(pid, p.category, stock)
+        if entered:
+            events.append(("product-lowstock", str(pid)))
+            LOW_STOCK_ALERTS.labels("emitted").inc()
+        elif entered is False:
+            LOW_STOCK_ALERTS.labels("suppressed").inc()
+    if price is not None:
+        events.append(("events", json.dumps({"type": "price_update", "id": pid, "price": price})))
+    return events
+
+async def publish_events(events):
+    """
+    Pubblica gli eventi di una richiesta tramite l'outbox: le richieste
+    concorrenti condividono la stessa pipeline Redis e, con Redis non
+    raggiungibile, la richiesta non attende l'invio.
+    """
+    await event_publisher.publish(events)
 
 
 @app.patch("/products/{pid}", response_model=Product)
 @limiter.limit(RATE_LIMIT)
 async def update_product(request: Request, pid: int, stock: int | None = None, price: float | None = None):
-    p = DB_PRODUCTS.get(pid)
+    [p] = await apply_updates([(pid, stock, price)])
     if not p:
         raise HTTPException(404, "Not found")
-    if stock is not None:
-        p.stock = stock
-        try:
-            r.publish("events", json.dumps({"type": "stock_update", "id": pid, "stock": stock}))
-            THRESHOLD = 25
-            if stock <= THRESHOLD:
-                r.publish("product-lowstock", str(pid))
-        except Exception as e: 
-            logger.error(f"Redis publish stock_update error: {e}", extra={"request_id": request_id_ctx.get()})
-    if price is not None:
-        p.price = price
-        try:
-            r.publish("events", json.dumps({"type": "price_update", "id": pid, "price": price}))
-        except Exception as e:
-            logger.error(f"Redis publish price_update error: {e}", extra={"request_id": request_id_ctx.get()})
+    await publish_events(product_events(p, stock=stock, price=price))
     return p
 
 from fastapi import Body
@@ -220,30 +687,120 @@ class ProductPatch(BaseModel):
 @limiter.limit(RATE_LIMIT)
 async def patch_multiple_products(
     request: Request,
-    updates: List[ProductPatch] = Body(...)
+    updates: List[ProductPatch] = Body(...),
+    batch_event: bool = BATCH_UPDATE_EVENTS,
 ):
+    """
+    Aggiorna più prodotti e pubblica tutti gli eventi in una sola pipeline Redis.
+    Con `batch_event=true` i singoli stock_update/price_update sono sostituiti da
+    un unico messaggio `batch_update` con l'elenco delle modifiche.
+    """
     updated = []
-    for upd in updates:
-        p = DB_PRODUCTS.get(upd.id)
+    events = []
+    changes = []
+    products = await apply_updates([(upd.id, upd.stock, upd.price) for upd in updates])
+    for upd, p in zip(updates, products):
         if not p:
             continue
-        if upd.stock is not None:
-            p.stock = upd.stock
-            try:
-                r.publish("events", json.dumps({"type": "stock_update", "id": upd.id, "stock": upd.stock}))
-                THRESHOLD = 25
-                if upd.stock <= THRESHOLD:
-                    r.publish("product-lowstock", str(upd.id))
-            except Exception as e:
-                logger.error(f"Redis publish stock_update error: {e}", extra={"request_id": request_id_ctx.get()})
-        if upd.price is not None:
-            p.price = upd.price
-            try:
-                r.publish("events", json.dumps({"type": "price_update", "id": upd.id, "price": upd.price}))
-            except Exception as e:
-                logger.error(f"Redis publish price_update error: {e}", extra={"request_id": request_id_ctx.get()})
+        product_changes = product_events(p, stock=upd.stock, price=upd.price)
+        if batch_event:
+            events.extend(e for e in product_changes if e[0] != "events")
+            change = {"id": upd.id}
+            if upd.stock is not None:
+                change["stock"] = upd.stock
+            if upd.price is not None:
+                change["price"] = upd.price
+            if len(change) > 1:
+                changes.append(change)
+        else:
+            events.extend(product_changes)
         updated.append(p)
+    if changes:
+        events.insert(0, ("events", json.dumps({"type": "batch_update", "changes": changes})))
+    await publish_events(events)
     return updated
 
+event_broadcaster = EventBroadcaster(event_reader, queue_size=SSE_QUEUE_SIZE, on_drop=SSE_DROPPED.inc)
+
+@app.get("/events/stream")
+@limiter.limit(RATE_LIMIT)
+async def events_stream(request: Request):
+    """
+    Eventi del catalogo (stock_update, price_update, batch_update, ...) come
+    Server-Sent Events: `event:` è il tipo, `data:` il messaggio JSON del canale Redis.
+
+    Con EVENTS_TRANSPORT=stream ogni evento ha un `id:` (id del Redis Stream):
+    alla riconnessione il browser invia Last-Event-ID e riceve prima gli
+    eventi persi (al massimo SSE_REPLAY_LIMIT), poi quelli nuovi.
+    """
+    last_event_id = request.headers.get("last-event-id") if EVENTS_TRANSPORT == "stream" else None
+    try:
+        last_key = stream_id_key(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = last_key = None
+
+    def format_event(event_id, kind, data):
+        prefix = f"id: {event_id}\n" if event_id else ""
+        return f"{prefix}event: {kind}\ndata: {data}\n\n"
+
+    async def stream():
+        nonlocal last_key
+        # Iscrizione alla prima iterazione: se il client si disconnette prima, il generatore
+        # non parte e non resta nulla da rilasciare; da qui in poi ci pensa il finally
+        subscriber = event_broadcaster.subscribe()
+        SSE_CLIENTS.inc()
+        try:
+            yield "retry: 3000\n\n"
+            if last_event_id:
+                # Iscritti prima della lettura: gli eventi arrivati nel frattempo sono in coda e
+                # quelli già inviati dal replay vengono scartati confrontando gli id
+                try:
+                    missed = await read_since(events_redis, EVENTS_STREAM, last_event_id, SSE_REPLAY_LIMIT)
+                except Exception as e:
+                    logger.error(f"SSE replay error: {e}", extra={"request_id": "", "trace_id": ""})
+                    missed = []
+                for event_id, data in missed:
+                    yield format_event(event_id, event_type(data), data)
+                if missed:
+                    last_key = stream_id_key(missed[-1][0])
+            while True:
+                try:
+                    item = await asyncio.wait_for(subscriber.queue.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if item is None:
+                    break
+                if last_key and item[0] and stream_id_key(item[0]) <= last_key:
+                    continue
+                yield format_event(*item)
+        finally:
+            event_broadcaster.unsubscribe(subscriber)
+            SSE_CLIENTS.dec()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def prepare_multiprocess_dir():
+    """
+    Prepara la directory delle metriche condivise tra i worker: va impostata
+    prima che i worker importino prometheus_client e svuotata a ogni avvio,
+    altrimenti i file dei processi precedenti verrebbero sommati allo scrape.
+    """
+    path = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "api-rest-metrics"))
+    os.makedirs(path, exist_ok=True)
+    for stale in glob.glob(os.path.join(path, "*.db")):
+        os.remove(stale)
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    if API_WORKERS > 1:
+        prepare_multiprocess_dir()
+        # Il supervisore multi-worker è la CLI di uvicorn: i worker importano "main"
+        # una sola volta (con lo spawn, eseguire questo file come __main__ lo importerebbe due volte)
+        os.execvp(sys.executable, [sys.executable, "-m", "uvicorn", "main:app", "--host", "0.0.0.0",
+                                   "--port", str(PORT), "--workers", str(API_WORKERS)])
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=PORT)
\ No newline at end of file
@@ -0,0 +1,287 @@
+import asyncio
+import gc
+import logging
+import mmap
+import os
+import shutil
+from typing import List
+
+import orjson
+from pydantic import TypeAdapter
+
+logger = logging.getLogger("api-rest")
+
+
+async def open_store(store, backend, base):
+    """
+    Carica in `store` il catalogo salvato da `backend`. Durante il caricamento
+    il GC ciclico è sospeso (milioni di oggetti allocati in blocco, nessun ciclo
+    da raccogliere) e alla fine gli oggetti caricati sono congelati, così le
+    raccolte successive non li riscansionano.
+    """
+    gc.disable()
+    try:
+        store.load(await backend.open(base))
+    finally:
+        gc.enable()
+        gc.freeze()
+
+
+class MemoryBackend:
+    """
+    Nessuna persistenza: a ogni avvio il catalogo riparte da BASE_PRODUCTS.
+    Definisce l'interfaccia comune dei backend:
+    - `open(base)`: catalogo da caricare all'avvio (`base` se non c'è nulla di salvato)
+    - `write(updates)`: rende persistenti le modifiche [(pid, stock, price)] prima che siano applicate
+    - `reset(products)`: sostituisce l'intero catalogo salvato
+    """
+
+    async def open(self, base):
+        return base
+
+    async def write(self, updates):
+        pass
+
+    async def reset(self, products):
+        pass
+
+    async def close(self):
+        pass
+
+
+class WalBackend(MemoryBackend):
+    """
+    Backend embedded: snapshot compatto + write-ahead log append-only in `directory`.
+
+    - `snapshot.json`: array JSON dell'intero catalogo, sostituito atomicamente
+    - `wal.log`: una riga JSON per richiesta con le modifiche [[pid, stock, price], ...]
+
+    Dopo `snapshot_every` righe il WAL viene ruotato in `wal.old.log` e lo
+    snapshot riscritto in un thread; le modifiche nel frattempo finiscono nel
+    nuovo WAL. Le modifiche impostano valori assoluti, quindi rieseguire
+    una riga già inclusa nello snapshot è innocuo: all'avvio si carica lo
+    snapshot (memory-mapped) e si applicano `wal.old.log` e `wal.log`.
+    """
+
+    SNAPSHOT = "snapshot.json"
+    WAL = "wal.log"
+    WAL_OLD = "wal.old.log"
+
+    def __init__(self, directory, store, product_cls, snapshot_every=10000, fsync=False):
+        self.directory = directory
+        self.store = store
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self._adapter = TypeAdapter(List[product_cls])
+        self._wal = None
+        self._entries = 0
+        self._inflight = 0
+        self._snapshot_task = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_snapshot(self):
+        path = self._path(self.SNAPSHOT)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return None
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return self._adapter.validate_json(data[:])
+
+    def _replay(self, products, name):
+        path = self._path(name)
+        if not os.path.exists(path):
+            return 0
+        index = {p.id: p for p in products}
+        count = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    updates = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    # Ultima riga troncata da un arresto durante la scrittura
+                    logger.warning(f"WAL {name}: riga non valida ignorata", extra={"request_id": ""})
+                    continue
+                for pid, stock, price in updates:
+                    p = index.get(pid)
+                    if p is None:
+                        continue
+                    if stock is not None:
+                        p.stock = stock
+                    if price is not None:
+                        p.price = price
+                count += 1
+        return count
+
+    def _load(self, base):
+        products = self._read_snapshot()
+        if products is None:
+            products = base
+            self._write_snapshot(products)
+        replayed = self._replay(products, self.WAL_OLD) + self._replay(products, self.WAL)
+        if replayed:
+            # Compattazione all'avvio: il prossimo restart legge solo lo snapshot
+            self._write_snapshot(products)
+            for name in (self.WAL_OLD, self.WAL):
+                if os.path.exists(self._path(name)):
+                    os.remove(self._path(name))
+        return products, replayed
+
+    def _write_snapshot(self, products):
+        tmp = self._path(self.SNAPSHOT + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(self._adapter.dump_json(products))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path(self.SNAPSHOT))
+
+    async def open(self, base):
+        products, replayed = await asyncio.to_thread(self._load, base)
+        self._wal = open(self._path(self.WAL), "ab")
+        logger.info(f"WAL store: {len(products)} prodotti, {replayed} righe WAL applicate", extra={"request_id": ""})
+        return products
+
+    async def write(self, updates):
+        if not updates:
+            return
+        if self._entries >= self.snapshot_every and self._snapshot_task is None and self._inflight == 0:
+            # Nessuna scrittura in corso: tutte le righe del WAL attuale sono già applicate al catalogo
+            self._start_snapshot()
+        self._wal.write(orjson.dumps(updates) + b"\n")
+        self._wal.flush()
+        self._entries += 1
+        if self.fsync:
+            self._inflight += 1
+            try:
+                await asyncio.to_thread(os.fsync, self._wal.fileno())
+            finally:
+                self._inflight -= 1
+
+    def _start_snapshot(self):
+        # Da qui in poi le modifiche vanno nel nuovo WAL; il vecchio serve solo finché lo snapshot non è scritto
+        self._wal.close()
+        old = self._path(self.WAL_OLD)
+        if os.path.exists(old):
+            # Lo snapshot precedente non è stato scritto: il vecchio WAL non è ancora coperto,
+            # quindi il WAL attuale gli viene accodato invece di sostituirlo
+            with open(self._path(self.WAL), "rb") as src, open(old, "ab") as dst:
+                shutil.copyfileobj(src, dst)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.remove(self._path(self.WAL))
+        else:
+            os.replace(self._path(self.WAL), old)
+        self._wal = open(self._path(self.WAL), "ab")
+        self._entries = 0
+        products = list(self.store.values())
+        self._snapshot_task = asyncio.create_task(self._snapshot(products))
+
+    async def _snapshot(self, products):
+        try:
+            await asyncio.to_thread(self._write_snapshot, products)
+            os.remove(self._path(self.WAL_OLD))
+        except Exception as e:
+            logger.error(f"WAL snapshot error: {e}", extra={"request_id": ""})
+        finally:
+            self._snapshot_task = None
+
+    async def reset(self, products):
+        if self._snapshot_task:
+            await self._snapshot_task
+        await asyncio.to_thread(self._write_snapshot, products)
+        # Le modifiche precedenti al reset non vanno riapplicate al prossimo avvio
+        if os.path.exists(self._path(self.WAL_OLD)):
+            os.remove(self._path(self.WAL_OLD))
+        self._wal.close()
+        self._wal = open(self._path(self.WAL), "wb")
+        self._entries = 0
+
+    async def close(self):
+        if self._snapshot_task:
+            await self._snapshot_task
+        if self._wal:
+            self._wal.close()
+
+
+class PostgresBackend(MemoryBackend):
+    """
+    Backend SQL: tabella `products` su PostgreSQL, con un pool di connessioni
+    psycopg2 usato da thread separati per non bloccare l'event loop.
+    """
+
+    COLUMNS = ("id", "name", "price", "stock", "category", "description")
+    # Chiave dell'advisory lock che serializza creazione, popolamento e reset della tabella tra i worker
+    LOCK_KEY = 0x70726F64
+
+    def __init__(self, dsn, product_cls, pool_size=10):
+        self.dsn = dsn
+        self.product_cls = product_cls
+        self.pool_size = pool_size
+        self._pool = None
+
+    def _run(self, fn):
+        conn = self._pool.getconn()
+        try:
+            with conn, conn.cursor() as cur:
+                return fn(cur)
+        finally:
+            self._pool.putconn(conn)
+
+    def _insert(self, cur, products):
+        from psycopg2.extras import execute_values
+        execute_values(
+            cur,
+            "INSERT INTO products (id, name, price, stock, category, description) VALUES %s",
+            [tuple(getattr(p, c) for c in self.COLUMNS) for p in products],
+            page_size=1000,
+        )
+
+    def _lock(self, cur):
+        # Rilasciato a fine transazione: gli altri worker attendono e trovano la tabella già popolata
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (self.LOCK_KEY,))
+
+    def _load(self, cur, base):
+        self._lock(cur)
+        cur.execute(
+            "CREATE TABLE IF NOT EXISTS products ("
+            "id INTEGER PRIMARY KEY, name TEXT NOT NULL, price DOUBLE PRECISION NOT NULL, "
+            "stock INTEGER NOT NULL, category TEXT, description TEXT)"
+        )
+        cur.execute("SELECT id, name, price, stock, category, description FROM products ORDER BY id")
+        rows = cur.fetchall()
+        if not rows:
+            self._insert(cur, base)
+            return base
+        return [self.product_cls.model_construct(**dict(zip(self.COLUMNS, row))) for row in rows]
+
+    async def open(self, base):
+        from psycopg2.pool import ThreadedConnectionPool
+        self._pool = await asyncio.to_thread(ThreadedConnectionPool, 1, self.pool_size, self.dsn)
+        return await asyncio.to_thread(self._run, lambda cur: self._load(cur, base))
+
+    async def write(self, updates):
+        if not updates:
+            return
+
+        def update(cur):
+            from psycopg2.extras import execute_batch
+            execute_batch(
+                cur,
+                "UPDATE products SET stock = COALESCE(%s, stock), price = COALESCE(%s, price) WHERE id = %s",
+                [(stock, price, pid) for pid, stock, price in updates],
+            )
+
+        await asyncio.to_thread(self._run, update)
+
+    async def reset(self, products):
+        def replace(cur):
+            self._lock(cur)
+            cur.execute("DELETE FROM products")
+            self._insert(cur, products)
+
+        await asyncio.to_thread(self._run, replace)
+
+    async def close(self):
+        if self._pool:
+            self._pool.closeall()
@@ -0,0 +1,174 @@
+import functools
+import logging
+import time
+from collections import OrderedDict
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger("api-rest")
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# GCRA: per ogni client si salva solo il TAT (theoretical arrival time, in ms).
+# ARGV: intervallo di emissione, tolleranza di burst, costo della richiesta,
+# richieste prenotate in precedenza e non usate (restituite), frazione delle
+# richieste residue da prenotare per il fast path locale.
+# Restituisce {ammessa, richieste ancora disponibili, retry_after_ms, prenotate}.
+GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local refund = tonumber(ARGV[4])
+local fraction = tonumber(ARGV[5])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now) - refund * interval
+if tat < now then tat = now end
+local new_tat = tat + cost * interval
+local allowed = 1
+local retry_after = 0
+local lease = 0
+if new_tat - burst > now then
+  allowed = 0
+  retry_after = new_tat - burst - now
+  new_tat = tat
+else
+  lease = math.floor(math.floor((now + burst - new_tat) / interval) * fraction)
+  new_tat = new_tat + lease * interval
+end
+if new_tat > now then
+  redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now))
+else
+  redis.call('DEL', KEYS[1])
+end
+local remaining = math.floor((now + burst - new_tat) / interval)
+return {allowed, remaining, retry_after, lease}
+"""
+
+class RateLimit:
+    """Limite nel formato "100/minute" (anche "10 per second")."""
+
+    def __init__(self, spec):
+        amount, _, period = spec.replace(" per ", "/").partition("/")
+        self.spec = spec
+        self.amount = int(amount)
+        self.period = PERIODS[period.strip().rstrip("s")]
+        self.interval_ms = self.period * 1000 / self.amount
+        self.burst_ms = self.period * 1000
+
+    def __str__(self):
+        unit = next(name for name, seconds in PERIODS.items() if seconds == self.period)
+        return f"{self.amount} per 1 {unit}"
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, limit, retry_after):
+        self.limit = limit
+        self.retry_after = retry_after
+
+
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    return JSONResponse(
+        {"error": f"Rate limit exceeded: {exc.limit}"},
+        status_code=429,
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
+
+
+def get_remote_address(request: Request):
+    return request.client.host if request.client else "127.0.0.1"
+
+
+class Limiter:
+    """
+    Rate limiter GCRA condiviso tra i worker: lo stato di ogni client è una
+    chiave Redis con scadenza, aggiornata da un unico script Lua atomico.
+
+    Fast path locale: a ogni round trip lo script prenota per il worker una
+    frazione `local_fraction` delle richieste residue del client, già
+    addebitate su Redis, che il worker concede poi senza round trip per al
+    massimo `local_ttl` secondi. Le prenotazioni non usate sono restituite alla
+    chiamata successiva. Il limite resta globale anche con più worker: ogni
+    worker concede solo richieste già prenotate. Con Redis non raggiungibile
+    le richieste sono ammesse (fail open); gli errori sono contati da `breaker`
+    (events.CircuitBreaker) e a circuito aperto lo script non viene nemmeno
+    tentato, così le richieste non attendono il timeout di Redis.
+    """
+
+    def __init__(self, redis, key_func=get_remote_address, prefix="ratelimit",
+                 local_fraction=0.1, local_ttl=1.0, max_local_keys=10000, breaker=None):
+        self.redis = redis
+        self.key_func = key_func
+        self.prefix = prefix
+        self.local_fraction = local_fraction
+        self.local_ttl = local_ttl
+        self.max_local_keys = max_local_keys
+        self.breaker = breaker
+        self._script = redis.register_script(GCRA_SCRIPT)
+        # key -> [richieste prenotate ancora concedibili localmente, scadenza]
+        self._local = OrderedDict()
+
+    async def hit(self, key, limit):
+        """Addebita una richiesta a `key`; restituisce None se ammessa, altrimenti i secondi di attesa."""
+        now = time.monotonic()
+        entry = self._local.get(key)
+        if entry is not None and entry[0] > 0 and entry[1] > now:
+            entry[0] -= 1
+            return None
+        if self.breaker is not None and self.breaker.retry_in() > 0:
+            return None
+        # Le prenotazioni residue sono prese prima dell'await: le richieste concorrenti sulla
+        # stessa chiave non le restituiscono due volte
+        refund = 0
+        if entry is not None:
+            refund, entry[0] = entry[0], 0
+        try:
+            allowed, remaining, retry_after, lease = await self._script(
+                keys=[key], args=[limit.interval_ms, limit.burst_ms, 1, refund, self.local_fraction]
+            )
+        except Exception as e:
+            logger.error(f"Rate limiter Redis error: {e}", extra={"request_id": ""})
+            if self.breaker is not None:
+                self.breaker.failure()
+            # Non restituite a Redis: restano disponibili in locale
+            self._grant(key, refund, now)
+            return None
+        if self.breaker is not None:
+            self.breaker.success()
+        self._grant(key, int(lease), now)
+        return None if allowed else retry_after / 1000
+
+    def _grant(self, key, lease, now):
+        # Si somma alla voce corrente: le prenotazioni ottenute dalle richieste concorrenti non si sovrascrivono
+        entry = self._local.get(key)
+        if entry is None:
+            self._local[key] = [lease, now + self.local_ttl]
+        else:
+            entry[0] += lease
+            entry[1] = now + self.local_ttl
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_local_keys:
+            self._local.popitem(last=False)
+
+    def limit(self, spec):
+        """Decoratore per endpoint con parametro `request: Request` (stessa firma di slowapi)."""
+        limit = RateLimit(spec)
+
+        def decorator(func):
+            scope = func.__name__
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                request = kwargs.get("request")
+                if request is None:
+                    request = next(a for a in args if isinstance(a, Request))
+                key = f"{self.prefix}:{scope}:{self.key_func(request)}"
+                retry_after = await self.hit(key, limit)
+                if retry_after is not None:
+                    raise RateLimitExceeded(limit, retry_after)
+                return await func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
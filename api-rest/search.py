@@ -0,0 +1,229 @@
+import heapq
+import re
+from array import array
+from bisect import bisect_left, insort
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+class SearchIndex:
+    """
+    Indice invertito su name, category e description: per ogni campo,
+    token -> id dei prodotti in ordine crescente (un int se il token compare
+    in un solo prodotto, altrimenti un array compatto). Un termine della query
+    corrisponde ai token uguali o che iniziano con il termine (ricerca per
+    prefisso, es. "lap" -> "laptop"); tutti i termini devono corrispondere.
+
+    Ranking: per ogni termine conta il miglior campo (name 3, category 2,
+    description 1), dimezzato se la corrispondenza è solo per prefisso; a
+    parità di punteggio vince l'id più basso.
+
+    I candidati sono le posting del termine più selettivo, visitate per
+    punteggio decrescente e id crescente; gli altri termini sono verificati
+    sul testo del singolo prodotto. La visita si ferma appena nessun candidato
+    rimasto può entrare tra i primi `limit`, quindi anche un termine presente
+    in tutto il catalogo costa poche decine di prodotti. Se i candidati che
+    soddisfano tutti i termini sono rari, dopo `VERIFY_BUDGET` verifiche si
+    passa all'intersezione delle posting (set di id, senza leggere il testo).
+    """
+
+    FIELDS = {"name": 3.0, "category": 2.0, "description": 1.0}
+    PREFIX_FACTOR = 0.5
+    # Verifiche sul testo dei candidati prima di passare all'intersezione delle posting
+    VERIFY_BUDGET = 2000
+    # Oltre questo numero di posting in un livello (prefisso con molti token, es. "1" su un
+    # catalogo con numeri nei nomi) le posting sono fuse in un unico array ordinato
+    MERGE_LISTS = 64
+    # Termini con posting fuse tenuti in memoria, per non ripetere la fusione a ogni ricerca
+    MERGED_CACHE = 32
+
+    def __init__(self, products=()):
+        self._postings = {field: {} for field in self.FIELDS}
+        self._tokens = None
+        self._products = {}
+        self._merged = {}
+        for p in products:
+            self.add(p)
+        self._sorted_tokens()
+
+    def __len__(self):
+        return len(self._products)
+
+    def add(self, product):
+        """Indicizza `product` (aggiornamento incrementale, senza ricostruire l'indice)."""
+        pid = product.id
+        self._products[pid] = product
+        self._merged.clear()
+        for field, postings in self._postings.items():
+            for token in set(tokenize(getattr(product, field))):
+                ids = postings.get(token)
+                if ids is None:
+                    postings[token] = pid
+                    self._add_token(token)
+                elif isinstance(ids, int):
+                    postings[token] = array("q", sorted((ids, pid)))
+                elif pid > ids[-1]:
+                    ids.append(pid)
+                else:
+                    insort(ids, pid)
+
+    def _add_token(self, token):
+        # Durante la costruzione iniziale la lista ordinata dei token è creata alla fine
+        if self._tokens is None:
+            return
+        i = bisect_left(self._tokens, token)
+        if i == len(self._tokens) or self._tokens[i] != token:
+            self._tokens.insert(i, token)
+
+    def _sorted_tokens(self):
+        if self._tokens is None:
+            tokens = set()
+            for postings in self._postings.values():
+                tokens.update(postings)
+            self._tokens = sorted(tokens)
+        return self._tokens
+
+    def _expand(self, term):
+        """Token corrispondenti a `term`: (token esatto o None, [token che iniziano con `term`])."""
+        tokens = self._sorted_tokens()
+        i = bisect_left(tokens, term)
+        # I token che iniziano con `term` sono contigui nella lista ordinata
+        j = bisect_left(tokens, term + "\U0010ffff", i)
+        exact = i < j and tokens[i] == term
+        return (term if exact else None), tokens[i + exact:j]
+
+    def _levels(self, term):
+        """
+        Posting di un termine raggruppate per punteggio: [(punteggio, [posting])], dal più alto.
+        Sono considerati tutti i token che iniziano con il termine; se un livello ne
+        raccoglie troppi, le posting sono fuse in un unico array.
+        """
+        cached = self._merged.get(term)
+        if cached is not None:
+            return cached
+        exact, prefixed = self._expand(term)
+        levels = {}
+        for field, weight in self.FIELDS.items():
+            postings = self._postings[field]
+            if exact in postings:
+                levels.setdefault(weight, []).append(postings[exact])
+            found = [ids for ids in map(postings.get, prefixed) if ids is not None]
+            if found:
+                levels.setdefault(weight * self.PREFIX_FACTOR, []).extend(found)
+        merged = False
+        for score, group in levels.items():
+            if len(group) > self.MERGE_LISTS:
+                merged_ids = set(ids for ids in group if isinstance(ids, int))
+                merged_ids.update(*(ids for ids in group if not isinstance(ids, int)))
+                levels[score] = [array("q", sorted(merged_ids))]
+                merged = True
+            else:
+                levels[score] = [(ids,) if isinstance(ids, int) else ids for ids in group]
+        levels = sorted(levels.items(), reverse=True)
+        if merged:
+            if len(self._merged) >= self.MERGED_CACHE:
+                self._merged.pop(next(iter(self._merged)))
+            self._merged[term] = levels
+        return levels
+
+    def _term_score(self, product, term):
+        best = 0.0
+        for field, weight in self.FIELDS.items():
+            for token in tokenize(getattr(product, field)):
+                if token.startswith(term):
+                    best = max(best, weight * (1.0 if token == term else self.PREFIX_FACTOR))
+        return best
+
+    @staticmethod
+    def _score_map(levels, candidates):
+        """id -> miglior punteggio del termine, per i soli `candidates` presenti nelle sue posting."""
+        scores = {}
+        remaining = set(candidates)
+        # Dal livello più alto: ogni id prende il primo punteggio trovato
+        for score, group in levels:
+            for ids in group:
+                found = remaining.intersection(ids)
+                if found:
+                    scores.update(dict.fromkeys(found, score))
+                    remaining -= found
+        return scores
+
+    def search(self, query, limit=20):
+        """Prodotti che corrispondono a tutti i termini di `query`, in ordine di rilevanza."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or limit <= 0:
+            return []
+        levels = {term: self._levels(term) for term in terms}
+        if not all(levels.values()):
+            return []
+        sizes = {t: sum(len(ids) for _, group in levels[t] for ids in group) for t in terms}
+        driver = min(terms, key=sizes.get)
+        others = sorted((t for t in terms if t != driver), key=sizes.get)
+        # Punteggio massimo ottenibile dagli altri termini (il loro livello più alto)
+        bound = sum(levels[t][0][0] for t in others)
+        best = self._top(levels[driver], others, bound, limit, budget=self.VERIFY_BUDGET)
+        if best is None:
+            # Pochi candidati soddisfano gli altri termini: si intersecano le posting, dalle più
+            # piccole, finché i candidati rimasti sono abbastanza pochi da verificarli sul testo
+            candidates = set().union(*(ids for _, group in levels[driver] for ids in group))
+            maps = {}
+            while others and len(candidates) > self.VERIFY_BUDGET:
+                term = others.pop(0)
+                maps[term] = self._score_map(levels[term], candidates)
+                candidates = set(maps[term])
+            best = self._top(levels[driver], others, bound, limit, maps=maps, candidates=candidates) if candidates else []
+        return [self._products[-pid] for _, pid in sorted(best, reverse=True)]
+
+    def _top(self, driver_levels, others, bound, limit, budget=None, maps=None, candidates=None):
+        """
+        Primi `limit` candidati come min-heap di (punteggio, -id), limitati agli
+        id in `candidates` se indicati. I termini in `maps` (id -> punteggio)
+        sono già verificati, quelli in `others` si verificano sul testo del
+        prodotto; None se le verifiche sul testo superano `budget`.
+        """
+        maps = maps or {}
+        best = []
+        seen = set()
+        checked = 0
+        for level, group in driver_levels:
+            # Un id più basso potrebbe ancora pareggiare il punteggio minimo: serve il ">" stretto
+            if len(best) == limit and best[0][0] > level + bound:
+                break
+            if candidates is not None:
+                ids = set().union(*group)
+                ids -= seen
+                seen |= ids
+                ids = sorted(ids.intersection(candidates))
+            else:
+                ids = heapq.merge(*group)
+            for pid in ids:
+                if candidates is None:
+                    if pid in seen:
+                        continue
+                    seen.add(pid)
+                score = level + sum(scores[pid] for scores in maps.values())
+                if others:
+                    checked += 1
+                    if budget is not None and checked > budget:
+                        return None
+                    product = self._products[pid]
+                    for term in others:
+                        term_score = self._term_score(product, term)
+                        if not term_score:
+                            score = None
+                            break
+                        score += term_score
+                if score is not None:
+                    item = (score, -pid)
+                    if len(best) < limit:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+                # Gli id successivi sono più alti: anche con il punteggio massimo non entrerebbero
+                if len(best) == limit and (level + bound, -pid) < best[0]:
+                    return best
+        return best
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import logging
+
+from events import EVENTS_CHANNEL
+
+logger = logging.getLogger("api-rest")
+
+
+class SharedCatalog:
+    """
+    Catalogo condiviso tra i worker uvicorn. Lo stato di riferimento è in Redis:
+    - `catalog:products`: id -> JSON del prodotto (campi che non cambiano)
+    - `catalog:stock` / `catalog:price`: id -> valore corrente
+
+    Ogni worker tiene una replica locale (`store`, un ProductStore) su cui
+    servono tutte le letture. Le scritture vanno prima su Redis e poi sulla
+    replica del worker che le esegue; gli altri worker riallineano i prodotti
+    citati dagli eventi del canale `events` (letti con `reader_factory()`, un
+    EventReader), rileggendoli da Redis: gli eventi sono solo un segnale,
+    l'ordine delle scritture lo decide Redis.
+    """
+
+    PRODUCTS_KEY = "catalog:products"
+    STOCK_KEY = "catalog:stock"
+    PRICE_KEY = "catalog:price"
+    RESET_EVENT = {"type": "catalog_reset"}
+
+    def __init__(self, redis, store, product_cls, reader_factory, publisher, on_load=None):
+        self.redis = redis
+        self.store = store
+        self.product_cls = product_cls
+        self.reader_factory = reader_factory
+        self.publisher = publisher
+        # Chiamata con i prodotti a ogni ricaricamento completo della replica
+        self.on_load = on_load or (lambda products: None)
+        self._task = None
+        self._ready = asyncio.Event()
+
+    async def seed(self, products):
+        """Scrive il catalogo iniziale solo per i prodotti non ancora presenti (idempotente tra worker)."""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for p in products:
+                pipe.hsetnx(self.PRODUCTS_KEY, p.id, p.model_dump_json(exclude={"stock", "price"}))
+                pipe.hsetnx(self.STOCK_KEY, p.id, p.stock)
+                pipe.hsetnx(self.PRICE_KEY, p.id, repr(p.price))
+            await pipe.execute()
+
+    async def load(self):
+        """Ricarica l'intera replica locale da Redis."""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(self.PRODUCTS_KEY)
+            pipe.hgetall(self.STOCK_KEY)
+            pipe.hgetall(self.PRICE_KEY)
+            products, stock, price = await pipe.execute()
+        items = []
+        for pid, raw in products.items():
+            data = json.loads(raw)
+            data["stock"] = int(stock[pid])
+            data["price"] = float(price[pid])
+            items.append(self.product_cls(**data))
+        items.sort(key=lambda p: p.id)
+        self.store.load(items)
+        self.on_load(items)
+
+    async def reset(self, products):
+        """Sostituisce il catalogo condiviso e avvisa gli altri worker con un evento catalog_reset."""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self.PRODUCTS_KEY, self.STOCK_KEY, self.PRICE_KEY)
+            for p in products:
+                pipe.hset(self.PRODUCTS_KEY, p.id, p.model_dump_json(exclude={"stock", "price"}))
+                pipe.hset(self.STOCK_KEY, p.id, p.stock)
+                pipe.hset(self.PRICE_KEY, p.id, repr(p.price))
+            await pipe.execute()
+        self.store.load(products)
+        self.on_load(products)
+        await self.publisher.publish([(EVENTS_CHANNEL, json.dumps(self.RESET_EVENT))])
+
+    async def write(self, updates):
+        """
+        Applica `updates` [(pid, stock, price)] su Redis in una transazione e poi
+        sulla replica locale; restituisce i prodotti aggiornati (None se assenti).
+        """
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for pid, stock, price in updates:
+                if pid not in self.store:
+                    continue
+                if stock is not None:
+                    pipe.hset(self.STOCK_KEY, pid, stock)
+                if price is not None:
+                    pipe.hset(self.PRICE_KEY, pid, repr(price))
+            await pipe.execute()
+        return [self.store.update(pid, stock=stock, price=price) for pid, stock, price in updates]
+
+    async def refresh(self, pids):
+        """Rilegge stock e prezzo dei prodotti `pids` da Redis e li applica alla replica."""
+        pids = [pid for pid in pids if pid in self.store]
+        if not pids:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hmget(self.STOCK_KEY, pids)
+            pipe.hmget(self.PRICE_KEY, pids)
+            stock, price = await pipe.execute()
+        for pid, s, p in zip(pids, stock, price):
+            if s is not None and p is not None:
+                self.store.update(pid, stock=int(s), price=float(p))
+
+    @staticmethod
+    def changed_ids(event):
+        """Id citati da un evento del canale (None = ricarica completa)."""
+        kind = event.get("type")
+        if kind in ("stock_update", "price_update"):
+            return [event["id"]]
+        if kind == "batch_update":
+            return [c["id"] for c in event.get("changes", ())]
+        if kind == "catalog_reset":
+            return None
+        return []
+
+    async def _follow(self):
+        while True:
+            try:
+                async with self.reader_factory() as reader:
+                    # Eventuali eventi persi mentre non eravamo iscritti: riallineamento completo
+                    await self.load()
+                    self._ready.set()
+                    while True:
+                        # Gli eventi già arrivati sono riallineati insieme, con un solo round trip
+                        messages = await reader.read(timeout=1.0)
+                        if messages:
+                            await self._apply(messages)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Shared catalog sync error: {e}", extra={"request_id": "", "trace_id": ""})
+                await asyncio.sleep(1)
+
+    async def _apply(self, messages):
+        pids = set()
+        for _, data in messages:
+            try:
+                ids = self.changed_ids(json.loads(data))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                continue
+            if ids is None:
+                await self.load()
+                return
+            pids.update(ids)
+        await self.refresh(sorted(pids))
+
+    async def start(self, products, timeout=10.0):
+        """Inizializza Redis (se vuoto), avvia la sincronizzazione e attende la prima replica completa."""
+        await self.seed(products)
+        self._task = asyncio.create_task(self._follow())
+        await asyncio.wait_for(self._ready.wait(), timeout)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,215 @@
+import threading
+import uuid
+from collections import deque
+from itertools import islice
+from sortedcontainers import SortedList
+
+from search import SearchIndex
+
+INF = float("inf")
+
+
+class InvalidSort(ValueError):
+    """Campo di ordinamento non supportato da `ProductStore.query`."""
+
+
+class ProductStore:
+    """
+    Catalogo prodotti in-memory con indici secondari:
+    - hash per categoria (category -> id, in ordine di inserimento)
+    - indici ordinati (valore, id) su stock e prezzo
+
+    Gli indici sono aggiornati incrementalmente da `update`, quindi filtri,
+    range e ordinamenti non richiedono una scansione lineare del catalogo.
+
+    `version` è un contatore globale incrementato da ogni modifica effettiva;
+    `product_version(pid)` è la versione dell'ultima modifica del prodotto.
+    Le ultime `change_log_size` modifiche restano in un change log, usato da
+    `changes_since` per la sincronizzazione incrementale dei client; `epoch`
+    cambia a ogni `load` (e tra processi diversi), invalidando le versioni precedenti.
+    """
+
+    SORT_FIELDS = ("id", "price", "stock")
+
+    def __init__(self, products=(), change_log_size=10000):
+        self.version = 0
+        self.change_log_size = change_log_size
+        self._search_lock = threading.Lock()
+        self.load(products)
+
+    def load(self, products):
+        self.version += 1
+        self.epoch = uuid.uuid4().hex[:12]
+        self._changes = deque(maxlen=self.change_log_size)
+        # Versione più vecchia da cui il change log è ancora completo
+        self._changes_floor = self.version
+        self._versions = {}
+        self._products = {}
+        self._by_category = {}
+        self._indexes = {"stock": SortedList(), "price": SortedList()}
+        self._search = None
+        for p in products:
+            self._products[p.id] = p
+            self._versions[p.id] = self.version
+            self._by_category.setdefault(p.category, {})[p.id] = None
+        self._indexes["stock"].update((p.stock, p.id) for p in self._products.values())
+        self._indexes["price"].update((p.price, p.id) for p in self._products.values())
+
+    def get(self, pid):
+        return self._products.get(pid)
+
+    def values(self):
+        return self._products.values()
+
+    def __contains__(self, pid):
+        return pid in self._products
+
+    def __len__(self):
+        return len(self._products)
+
+    def product_version(self, pid):
+        return self._versions.get(pid)
+
+    def update(self, pid, stock=None, price=None):
+        p = self._products.get(pid)
+        if p is None:
+            return None
+        changed = False
+        if stock is not None:
+            changed |= self._reindex("stock", pid, p.stock, stock)
+            p.stock = stock
+        if price is not None:
+            changed |= self._reindex("price", pid, p.price, price)
+            p.price = price
+        if changed:
+            self.version += 1
+            self._versions[pid] = self.version
+            if not self._changes.maxlen:
+                # Change log disabilitato: nessuna versione precedente è coperta
+                self._changes_floor = self.version
+            elif len(self._changes) == self._changes.maxlen:
+                self._changes_floor = self._changes[0][0]
+            self._changes.append((self.version, pid))
+        return p
+
+    def changes_since(self, since):
+        """
+        Prodotti modificati dopo la versione `since`, in ordine di ultima modifica
+        e senza duplicati; None se il change log non copre più `since`.
+        """
+        if since < self._changes_floor:
+            return None
+        pids = {}
+        for version, pid in reversed(self._changes):
+            if version <= since:
+                break
+            pids.setdefault(pid, None)
+        return [self._products[pid] for pid in reversed(pids)]
+
+    def _reindex(self, field, pid, old, new):
+        if old == new:
+            return False
+        index = self._indexes[field]
+        index.remove((old, pid))
+        index.add((new, pid))
+        return True
+
+    def _range_ids(self, field, lo, hi, reverse=False):
+        index = self._indexes[field]
+        lo_key = (lo, -INF) if lo is not None else None
+        hi_key = (hi, INF) if hi is not None else None
+        return (pid for _, pid in index.irange(lo_key, hi_key, reverse=reverse))
+
+    def _range_count(self, field, lo, hi):
+        index = self._indexes[field]
+        start = index.bisect_left((lo, -INF)) if lo is not None else 0
+        end = index.bisect_right((hi, INF)) if hi is not None else len(index)
+        return max(0, end - start)
+
+    def query(self, category=None, min_stock=None, max_stock=None, min_price=None, max_price=None, sort=None, limit=None):
+        """
+        Restituisce i prodotti che soddisfano i filtri, ordinati per `sort`
+        ("price", "-stock", ...; default: id crescente), al massimo `limit`.
+
+        La scansione parte dalla sorgente più selettiva (categoria o range su
+        un indice ordinato); gli altri filtri sono verificati sul singolo prodotto.
+        """
+        reverse = bool(sort) and sort.startswith("-")
+        sort_field = sort.lstrip("-") if sort else "id"
+        if sort_field not in self.SORT_FIELDS:
+            raise InvalidSort(f"sort non valido: {sort}")
+
+        ranges = {}
+        if min_stock is not None or max_stock is not None:
+            ranges["stock"] = (min_stock, max_stock)
+        if min_price is not None or max_price is not None:
+            ranges["price"] = (min_price, max_price)
+
+        sources = [(self._range_count(f, lo, hi), f) for f, (lo, hi) in ranges.items()]
+        if category is not None:
+            sources.append((len(self._by_category.get(category, ())), "category"))
+
+        def matches(p):
+            if category is not None and p.category != category:
+                return False
+            for f, (lo, hi) in ranges.items():
+                value = getattr(p, f)
+                if (lo is not None and value < lo) or (hi is not None and value > hi):
+                    return False
+            return True
+
+        driver = min(sources)[1] if sources else None
+        if sort_field in self._indexes and driver in (None, sort_field):
+            # L'indice dell'ordinamento è anche la sorgente più selettiva: nessun sort, stop anticipato su limit
+            lo, hi = ranges.get(sort_field, (None, None))
+            items = (self._products[pid] for pid in self._range_ids(sort_field, lo, hi, reverse=reverse))
+            return list(islice((p for p in items if matches(p)), limit))
+        if driver is None:
+            items = self._products.values()
+            if reverse:
+                items = reversed(items)
+            return list(islice(items, limit))
+
+        if driver == "category":
+            ids = self._by_category.get(category, ())
+        else:
+            lo, hi = ranges[driver]
+            ids = self._range_ids(driver, lo, hi)
+        items = [p for p in (self._products[pid] for pid in ids) if matches(p)]
+        if driver != "category" or sort_field != "id" or reverse:
+            items.sort(key=lambda p: (getattr(p, sort_field), p.id), reverse=reverse)
+        return items[:limit] if limit is not None else items
+
+    def search_index(self):
+        """
+        Indice full-text del catalogo, costruito alla prima ricerca dopo ogni `load`
+        (anche da un thread: una sola costruzione alla volta). name, category e
+        description non cambiano con `update`, quindi l'indice resta valido.
+        """
+        with self._search_lock:
+            products = self._products
+            if self._search is None:
+                index = SearchIndex(products.values())
+                # Un `load` durante la costruzione rende l'indice già vecchio
+                if self._products is not products:
+                    return index
+                self._search = index
+            return self._search
+
+    @property
+    def search_ready(self):
+        return self._search is not None
+
+    def search(self, query, limit=20):
+        return self.search_index().search(query, limit)
+
+    def recommendations(self, pid, limit):
+        """Prodotti della stessa categoria di `pid`, completati con altri prodotti fino a `limit`."""
+        category = self._products[pid].category
+        same = (self._products[i] for i in self._by_category.get(category, ()) if i != pid)
+        items = list(islice(same, limit))
+        if len(items) < limit:
+            chosen = {p.id for p in items}
+            others = (p for p in self._products.values() if p.id != pid and p.id not in chosen)
+            items.extend(islice(others, limit - len(items)))
+        return items
@@ -34,6 +34,10 @@ const DEFAULTS = [
     name: 'Cerca prodotti low stock',
     body: '{\n  "jsonrpc": "2.0",\n  "id": 1,\n  "method": "callTool",\n  "params": {\n    "name": "catalog.searchLowStock",\n    "arguments": { "threshold": 25 }\n  }\n}',
   },
+  {
+    name: 'Batch: low stock, sconto e notifica ordini',
+    body: '[\n  {\n    "jsonrpc": "2.0",\n    "id": 1,\n    "method": "callTool",\n    "params": {\n      "name": "catalog.searchLowStock",\n      "arguments": { "threshold": 25 }\n    }\n  },\n  {\n    "jsonrpc": "2.0",\n    "id": 2,\n    "method": "callTool",\n    "params": {\n      "name": "catalog.applyDiscount",\n      "arguments": { "product_id": 1, "percent": 10, "threshold": 25 }\n    }\n  },\n  {\n    "jsonrpc": "2.0",\n    "id": 3,\n    "method": "callTool",\n    "params": {\n      "name": "orders.notifyPending",\n      "arguments": { "product_id": 1 }\n    }\n  }\n]',
+  },
 ];
 
 export default function ApiJsonRpc() {
@@ -1,6 +1,7 @@
 import { ApolloServer } from 'apollo-server';
 import { gql } from 'apollo-server';
 import fetch from 'node-fetch';
+import DataLoader from 'dataloader';
 import depthLimit from 'graphql-depth-limit';
 import { register, Counter, Histogram } from 'prom-client';
 import winston from 'winston';
@@ -11,6 +12,9 @@ const LOW_STOCK_THRESHOLD = parseInt(process.env.LOW_STOCK_THRESHOLD || "25", 10
 const GRAPHQL_DEPTH_LIMIT = parseInt(process.env.GRAPHQL_DEPTH_LIMIT || "7", 10);
 const INTROSPECTION_ENABLED = process.env.INTROSPECTION_ENABLED !== "false";
 const RATE_LIMIT_PER_MIN = parseInt(process.env.RATE_LIMIT_PER_MIN || "100", 10);
+const ETAG_CACHE_SIZE = parseInt(process.env.ETAG_CACHE_SIZE || "500", 10);
+// Deve coincidere con BATCH_MAX_IDS di api-rest: oltre, /products:batch risponde 400
+const BATCH_MAX_IDS = parseInt(process.env.BATCH_MAX_IDS || "500", 10);
 //const RATE_LIMIT_PER_MIN = 10; // override temporaneo per test
 
 const logger = winston.createLogger({
@@ -73,6 +77,60 @@ function checkRateLimit(ip) {
   return true;
 }
 
+// Corpi REST già ricevuti, rivalidati con If-None-Match: se api-rest risponde 304 si riusa il corpo
+const etagCache = new Map();
+
+async function restGet(url) {
+  const cached = etagCache.get(url);
+  const res = await fetch(url, cached ? { headers: { 'If-None-Match': cached.etag } } : undefined);
+  if (res.status === 304 && cached) {
+    etagCache.delete(url);
+    etagCache.set(url, cached);
+    return { status: 200, body: cached.body };
+  }
+  const body = await res.json();
+  const etag = res.headers.get('etag');
+  if (res.status === 200 && etag) {
+    etagCache.delete(url);
+    etagCache.set(url, { etag, body });
+    if (etagCache.size > ETAG_CACHE_SIZE) {
+      etagCache.delete(etagCache.keys().next().value);
+    }
+  }
+  return { status: res.status, body };
+}
+
+// DataLoader per richiesta: le letture prodotto/raccomandazioni di una stessa query GraphQL
+// vengono raccolte in un'unica chiamata a /products:batch invece di una fetch per resolver
+function createLoaders() {
+  return {
+    product: new DataLoader(async (ids) => {
+      const res = await restGet(`${REST_BASE}/products:batch?ids=${ids.join(',')}`);
+      if (res.status !== 200) return ids.map(() => null);
+      const byId = new Map(res.body.products.map(p => [String(p.id), p]));
+      return ids.map(id => byId.get(String(id)) || null);
+    }, { maxBatchSize: BATCH_MAX_IDS }),
+    // chiave "id:limit"; una chiamata batch per ogni limit distinto
+    recommendations: new DataLoader(async (keys) => {
+      const byLimit = new Map();
+      for (const key of keys) {
+        const [id, limit] = key.split(':');
+        if (!byLimit.has(limit)) byLimit.set(limit, []);
+        byLimit.get(limit).push(id);
+      }
+      const results = new Map();
+      await Promise.all([...byLimit.entries()].map(async ([limit, ids]) => {
+        const res = await restGet(`${REST_BASE}/products:batch?ids=${ids.join(',')}&recommendations=${limit}`);
+        if (res.status !== 200) return;
+        for (const p of res.body.products) {
+          results.set(`${p.id}:${limit}`, p.recommendations);
+        }
+      }));
+      return keys.map(key => results.get(key) || []);
+    }, { maxBatchSize: BATCH_MAX_IDS }),
+  };
+}
+
 const typeDefs = gql`
   type Product {
     id: ID!
@@ -97,30 +155,18 @@ const typeDefs = gql`
 const resolvers = {
   Product: {
     lowStock: (parent) => parent.stock <= LOW_STOCK_THRESHOLD,
-    recommendations: async (parent, { limit }, context) => {
-      const res = await fetch(`${REST_BASE}/products/${parent.id}/recommendations?limit=${limit}`);
-      if (res.status !== 200) return [];
-      return res.json();
-    },
+    recommendations: (parent, { limit }, context) => context.loaders.recommendations.load(`${parent.id}:${limit}`),
   },
   Query: {
-    product: async (_, { id }, context) => {
-      const res = await fetch(`${REST_BASE}/products/${id}`);
-      if (res.status !== 200) return null;
-      return res.json();
-    },
+    product: (_, { id }, context) => context.loaders.product.load(id),
     products: async (_, { limit, category }, context) => {
       const qs = new URLSearchParams();
       if (limit) qs.append("limit", limit);
       if (category) qs.append("category", category);
-      const res = await fetch(`${REST_BASE}/products${qs.toString() ? "?" + qs.toString() : ""}`);
-      return res.json();
-    },
-    recommendations: async (_, { id, limit }, context) => {
-      const res = await fetch(`${REST_BASE}/products/${id}/recommendations?limit=${limit}`);
-      if (res.status !== 200) return [];
-      return res.json();
+      const res = await restGet(`${REST_BASE}/products${qs.toString() ? "?" + qs.toString() : ""}`);
+      return res.body;
     },
+    recommendations: (_, { id, limit }, context) => context.loaders.recommendations.load(`${id}:${limit}`),
   },
 };
 
@@ -149,6 +195,7 @@ const server = new ApolloServer({
     return {
       requestId,
       traceId,
+      loaders: createLoaders(),
     };
   },
   plugins: [
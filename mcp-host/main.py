@@ -1,12 +1,15 @@
 from openai import OpenAI
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
-import requests
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-import subprocess
+from collections import OrderedDict
+import asyncio
+import itertools
+import httpx
 import json
 import os
+import sys
 
 app = FastAPI()
 app.add_middleware(
@@ -20,6 +23,9 @@ app.add_middleware(
 load_dotenv()
 LLM_MODEL = os.getenv("LLM_MODEL", "phi3")
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/chat")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+
+HTTP_CLIENT = httpx.AsyncClient(timeout=httpx.Timeout(LLM_TIMEOUT, connect=5.0))
 
 @app.get("/health")
 async def health():
@@ -37,7 +43,7 @@ async def llm_invoke(request: Request):
     if not prompt:
         return JSONResponse(status_code=400, content={"error": "Prompt richiesto"})
 
-    allowed_keywords = ["catalog.", "orders.", "tool MCP", "sconto", "prezzo", "stock", "prodotto", "reset"]
+    allowed_keywords = ["catalog.", "orders.", "tool MCP", "sconto", "prezzo", "stock", "prodotto", "reset", "cerca"]
     if not any(kw.lower() in prompt.lower() for kw in allowed_keywords):
         return JSONResponse(status_code=403, content={"error": "Richiesta non consentita: puoi solo usare i tool MCP (catalog, orders, sconto, prezzo, stock, prodotto, reset)"})
 
@@ -48,6 +54,7 @@ async def llm_invoke(request: Request):
     "- catalog.resetPriceAll: Reset the base price of all products with stock >= threshold\n"
     "- catalog.applyDiscount: Apply a percent discount to a product if not already discounted and stock < threshold\n"
     "- catalog.resetPrice: Reset product price to base if stock >= threshold\n"
+    "- catalog.searchProducts: Search products by name, category or description (query, optional limit)\n"
     "- orders.notifyPending: Notify about pending orders. You can use it to notify a specific product ( product_id ).\n"
     "Esempi di risposta:\n"
     '{\n  "jsonrpc": "2.0",\n  "id": 1,\n  "method": "callTool",\n  "params": {\n    "name": "orders.notifyPending",\n    "arguments": { "product_id": 123 }\n  }\n}'
@@ -56,6 +63,7 @@ async def llm_invoke(request: Request):
     '{\n  "jsonrpc": "2.0",\n  "id": 1,\n  "method": "callTool",\n  "params": {\n    "name": "catalog.applyDiscountAll",\n    "arguments": { "percent": 10, "threshold": 25 }\n  }\n}'
     '{\n  "jsonrpc": "2.0",\n  "id": 1,\n  "method": "callTool",\n  "params": {\n    "name": "catalog.resetPriceAll",\n    "arguments": { "threshold": 25 }\n  }\n}'
     '{\n  "jsonrpc": "2.0",\n  "id": 1,\n  "method": "callTool",\n  "params": {\n    "name": "catalog.searchLowStock",\n    "arguments": { "threshold": 25 }\n  }\n}'
+    '{\n  "jsonrpc": "2.0",\n  "id": 1,\n  "method": "callTool",\n  "params": {\n    "name": "catalog.searchProducts",\n    "arguments": { "query": "wireless mouse" }\n  }\n}'
     "Non aggiungere spiegazioni, testo extra, markdown o altro. Solo il JSON-RPC. Se la richiesta non riguarda questi tool, rispondi solo con: {\"error\": \"Posso solo aiutarti con i tool MCP.\"}"
 )
     data = {
@@ -66,22 +74,22 @@ async def llm_invoke(request: Request):
         ]
     }
     try:
-        resp = requests.post(OLLAMA_URL, json=data, stream=True)
-        resp.raise_for_status()
         result = ""
         buffer = b""
-        for chunk in resp.iter_content(chunk_size=None):
-            buffer += chunk
-            while b"\n" in buffer:
-                line, buffer = buffer.split(b"\n", 1)
-                if not line:
-                    continue
-                try:
-                    obj = json.loads(line)
-                    if "message" in obj and obj["message"]["role"] == "assistant":
-                        result += obj["message"].get("content", "")
-                except Exception:
-                    continue
+        async with HTTP_CLIENT.stream("POST", OLLAMA_URL, json=data) as resp:
+            resp.raise_for_status()
+            async for chunk in resp.aiter_bytes():
+                buffer += chunk
+                while b"\n" in buffer:
+                    line, buffer = buffer.split(b"\n", 1)
+                    if not line:
+                        continue
+                    try:
+                        obj = json.loads(line)
+                        if "message" in obj and obj["message"]["role"] == "assistant":
+                            result += obj["message"].get("content", "")
+                    except Exception:
+                        continue
         if buffer:
             try:
                 obj = json.loads(buffer)
@@ -108,9 +116,7 @@ async def llm_invoke(request: Request):
                     pass
         if json_rpc and isinstance(json_rpc, dict) and json_rpc.get("method") == "callTool":
             try:
-                mcp_resp = requests.post("http://localhost:5000/rpc", json=json_rpc)
-                mcp_resp.raise_for_status()
-                mcp_result = mcp_resp.json()
+                mcp_result = await dispatch_rpc(json_rpc)
                 summary = "Azione MCP eseguita: "
                 params = json_rpc.get("params", {})
                 tool = params.get("name")
@@ -129,43 +135,286 @@ async def llm_invoke(request: Request):
 
 
 
-def call_mcp_server(server_script, method, params=None):
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", "2"))
+MCP_QUEUE_DEPTH = int(os.getenv("MCP_QUEUE_DEPTH", "64"))
+MCP_CALL_TIMEOUT = float(os.getenv("MCP_CALL_TIMEOUT", "30"))
+MCP_MAX_BATCH = int(os.getenv("MCP_MAX_BATCH", "32"))
+MCP_RESTART_BACKOFF = float(os.getenv("MCP_RESTART_BACKOFF", "0.5"))
+MCP_RESTART_MAX = float(os.getenv("MCP_RESTART_MAX", "30"))
+
+
+class McpWorker:
+    """
+    Processo server MCP long-lived: stdin/stdout restano aperte (pipe asyncio)
+    e le risposte vengono smistate sulle richieste in attesa tramite l'`id` JSON-RPC.
+    """
+
+    def __init__(self, server_script, ids):
+        self.server_script = server_script
+        self.ids = ids
+        self.pending = OrderedDict()
+        # Richieste in corso, contando ogni elemento dei batch (gli elementi di un batch condividono un future in `pending`)
+        self.in_flight = 0
+        self.closed = False
+        # Processo terminato e non ancora riavviato: le chiamate falliscono subito
+        self.down = False
+        self.restart_delay = MCP_RESTART_BACKOFF
+        self.started_at = 0.0
+        self.proc = None
+        self.reader = None
+
+    async def start(self):
+        self.proc = await asyncio.create_subprocess_exec(
+            sys.executable, self.server_script,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            limit=MCP_LINE_LIMIT
+        )
+        self.started_at = asyncio.get_running_loop().time()
+        self.down = False
+        self.reader = asyncio.create_task(self._read_loop(self.proc))
+
+    async def call_batch(self, requests, timeout, batch=True):
+        """
+        Invia `requests` come batch JSON-RPC (una riga con un array) e restituisce
+        le risposte nello stesso ordine; con batch=False invia la singola richiesta.
+        Ogni elemento riceve un id interno, registrato tra le richieste in attesa
+        con lo stesso future: la risposta si abbina tramite uno qualsiasi degli id.
+        """
+        if self.down:
+            return [_mcp_error(r.get("id"), "MCP server non disponibile") for r in requests]
+        internal_ids = [next(self.ids) for _ in requests]
+        payload = [{**request, "id": internal_id} for request, internal_id in zip(requests, internal_ids)]
+        future = asyncio.get_running_loop().create_future()
+        self.pending.update(dict.fromkeys(internal_ids, future))
+        self.in_flight += len(requests)
+        try:
+            self.proc.stdin.write((json.dumps(payload if batch else payload[0]) + "\n").encode())
+            await self.proc.stdin.drain()
+            response = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return [_mcp_error(r.get("id"), f"Timeout MCP dopo {timeout}s", code=-32002) for r in requests]
+        except (BrokenPipeError, ConnectionResetError):
+            return [_mcp_error(r.get("id"), "MCP server non disponibile") for r in requests]
+        finally:
+            # Anche in caso di cancellazione del chiamante la risposta tardiva viene scartata
+            for internal_id in internal_ids:
+                self.pending.pop(internal_id, None)
+            self.in_flight -= len(requests)
+        responses = response if isinstance(response, list) else [response]
+        if len(responses) == 1 and responses[0].get("id") is None:
+            # Errore senza id: riguarda l'intera riga inviata
+            responses = responses * len(requests)
+        else:
+            by_id = {item.get("id"): item for item in responses if isinstance(item, dict)}
+            missing = _mcp_error(None, "Risposta MCP mancante")
+            responses = [by_id.get(internal_id, missing) for internal_id in internal_ids]
+        return [{**item, "id": r.get("id")} for r, item in zip(requests, responses)]
+
+    async def _read_loop(self, proc):
+        while True:
+            try:
+                line = await proc.stdout.readline()
+            except ValueError:
+                print("[MCP] riga di risposta oltre MCP_LINE_LIMIT, scartata", file=sys.stderr, flush=True)
+                continue
+            if not line:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                response = json.loads(line)
+            except Exception:
+                print("[MCP] risposta non valida:", repr(line), file=sys.stderr, flush=True)
+                continue
+            # La risposta a un batch è un array: si abbina tramite il primo id in attesa tra i suoi elementi
+            items = response if isinstance(response, list) else [response]
+            response_ids = [item.get("id") for item in items if isinstance(item, dict) and item.get("id") is not None]
+            future = next((self.pending[i] for i in response_ids if i in self.pending), None)
+            # I server possono rispondere fuori ordine e includono sempre l'id; un errore senza id
+            # (riga non interpretabile) viene attribuito alla richiesta più vecchia ancora in attesa
+            if future is None and not response_ids:
+                future = next((f for f in self.pending.values() if not f.done()), None)
+            if future is not None and not future.done():
+                future.set_result(response)
+        await proc.wait()
+        self.down = True
+        orphans = list(self.pending.values())
+        self.pending.clear()
+        for future in orphans:
+            if not future.done():
+                future.set_result(_mcp_error(None, "MCP server terminato durante la richiesta"))
+        if not self.closed:
+            await self._restart(proc.returncode)
+
+    async def _restart(self, returncode):
+        """
+        Riavvia il processo con backoff esponenziale (da MCP_RESTART_BACKOFF fino a
+        MCP_RESTART_MAX secondi), così un server che termina all'avvio non viene
+        rilanciato in un ciclo continuo. Il ritardo torna al minimo se il processo
+        precedente è rimasto attivo almeno MCP_RESTART_MAX secondi.
+        """
+        loop = asyncio.get_running_loop()
+        if loop.time() - self.started_at >= MCP_RESTART_MAX:
+            self.restart_delay = MCP_RESTART_BACKOFF
+        print(f"[MCP] {self.server_script} terminato (exit {returncode}), riavvio tra {self.restart_delay:.1f}s",
+              file=sys.stderr, flush=True)
+        while not self.closed:
+            await asyncio.sleep(self.restart_delay)
+            self.restart_delay = min(self.restart_delay * 2, MCP_RESTART_MAX)
+            if self.closed:
+                return
+            try:
+                await self.start()
+                return
+            except Exception as e:
+                print(f"[MCP] avvio di {self.server_script} fallito: {e}, nuovo tentativo tra {self.restart_delay:.1f}s",
+                      file=sys.stderr, flush=True)
+
+    async def close(self):
+        self.closed = True
+        if self.down:
+            # In attesa del riavvio: il backoff viene interrotto
+            self.reader.cancel()
+        elif self.proc.returncode is None:
+            self.proc.stdin.close()
+            try:
+                await asyncio.wait_for(self.proc.wait(), 5)
+            except asyncio.TimeoutError:
+                self.proc.kill()
+        try:
+            await self.reader
+        except asyncio.CancelledError:
+            pass
+
+
+class McpWorkerPool:
+    """Pool di `size` processi per uno script server MCP, con coda limitata a `queue_depth` richieste."""
+
+    def __init__(self, server_script, size=MCP_POOL_SIZE, queue_depth=MCP_QUEUE_DEPTH):
+        self.queue_depth = queue_depth
+        ids = itertools.count(1)
+        self.workers = [McpWorker(server_script, ids) for _ in range(max(1, size))]
+
+    async def start(self):
+        await asyncio.gather(*(w.start() for w in self.workers))
+
+    def in_flight(self):
+        return sum(w.in_flight for w in self.workers)
+
+    async def call(self, request, timeout=MCP_CALL_TIMEOUT):
+        return (await self.call_batch([request], timeout, batch=False))[0]
+
+    async def call_batch(self, requests, timeout=MCP_CALL_TIMEOUT, batch=True):
+        # Ogni elemento del batch conta come una richiesta verso queue_depth
+        if self.in_flight() + len(requests) > self.queue_depth:
+            return [_mcp_error(r.get("id"), "MCP server occupato, coda piena", code=-32001) for r in requests]
+        # I worker in attesa di riavvio sono scelti solo se nessun altro è disponibile
+        worker = min(self.workers, key=lambda w: (w.down, w.in_flight))
+        return await worker.call_batch(requests, timeout, batch=batch)
+
+    async def close(self):
+        await asyncio.gather(*(w.close() for w in self.workers))
+
+
+def _mcp_error(id_, message, code=-32000):
+    return {"jsonrpc": "2.0", "id": id_, "error": {"code": code, "message": message}}
+
+
+MCP_LINE_LIMIT = 16 * 1024 * 1024
+MCP_POOLS = {}
+MCP_POOLS_LOCK = asyncio.Lock()
+
+
+async def get_pool(server_script):
+    pool = MCP_POOLS.get(server_script)
+    if pool is not None:
+        return pool
+    async with MCP_POOLS_LOCK:
+        if server_script not in MCP_POOLS:
+            pool = McpWorkerPool(server_script)
+            await pool.start()
+            MCP_POOLS[server_script] = pool
+        return MCP_POOLS[server_script]
+
+
+@app.on_event("shutdown")
+async def close_pools():
+    await asyncio.gather(*(pool.close() for pool in MCP_POOLS.values()))
+    await HTTP_CLIENT.aclose()
+
+
+async def call_mcp_server(server_script, method, params=None):
     request = {"jsonrpc": "2.0", "id": 1, "method": method}
     if params:
         request["params"] = params
-    proc = subprocess.Popen(
-        ["python", server_script],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        text=True
-    )
-    stdout, _ = proc.communicate(json.dumps(request) + "\n")
-    return json.loads(stdout.strip())
+    pool = await get_pool(server_script)
+    return await pool.call(request)
 
 
 CATALOG_SERVER = os.getenv("CATALOG_SERVER", "/app/server-catalog.py")
 ORDERS_SERVER = os.getenv("ORDERS_SERVER", "/app/server-orders.py")
 
+
+def server_for(body):
+    method = body.get("method", "")
+    if method.startswith("orders.") or (method == "callTool" and body.get("params", {}).get("name", "").startswith("orders.")):
+        return ORDERS_SERVER
+    return CATALOG_SERVER
+
+
+async def dispatch_rpc(body):
+    pool = await get_pool(server_for(body))
+    return await pool.call(body)
+
+
+async def dispatch_batch(body):
+    """
+    Batch JSON-RPC 2.0: le richieste sono divise tra i server MCP (catalog,
+    orders), ogni parte è inviata come un unico batch e le parti sono eseguite
+    in parallelo; le risposte tornano nell'ordine delle richieste. Le notifiche
+    (senza "id") sono eseguite ma non hanno risposta.
+    """
+    if not body:
+        return _mcp_error(None, "Batch JSON-RPC vuoto", code=-32600)
+    if len(body) > MCP_MAX_BATCH:
+        return _mcp_error(None, f"Batch JSON-RPC oltre {MCP_MAX_BATCH} richieste", code=-32600)
+    responses = [None] * len(body)
+    parts = {}
+    for i, item in enumerate(body):
+        if isinstance(item, dict):
+            parts.setdefault(server_for(item), []).append(i)
+        else:
+            responses[i] = _mcp_error(None, "Richiesta JSON-RPC non valida", code=-32600)
+
+    async def run(server_script, indexes):
+        pool = await get_pool(server_script)
+        for i, response in zip(indexes, await pool.call_batch([body[i] for i in indexes])):
+            responses[i] = response
+
+    await asyncio.gather(*(run(server_script, indexes) for server_script, indexes in parts.items()))
+    return [response for item, response in zip(body, responses) if not _is_notification(item)]
+
+
+def _is_notification(item):
+    return isinstance(item, dict) and "id" not in item
+
+
 @app.post("/rpc")
 async def rpc_proxy(request: Request):
     body = await request.json()
-    method = body.get("method", "")
-    if method.startswith("orders.") or (method == "callTool" and body.get("params", {}).get("name", "").startswith("orders.")):
-        server_script = ORDERS_SERVER
+    if isinstance(body, list):
+        response = await dispatch_batch(body)
+        errors = [item["error"] for item in response if "error" in item] if isinstance(response, list) else [response["error"]]
     else:
-        server_script = CATALOG_SERVER
-    proc = subprocess.Popen([
-        "python", server_script
-    ], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    stdout, stderr = proc.communicate(json.dumps(body) + "\n")
-    import sys
-    print("[MCP DEBUG] STDOUT RAW:", repr(stdout), file=sys.stderr, flush=True)
-    if stderr:
-        print("[MCP DEBUG] STDERR RAW:", repr(stderr), file=sys.stderr, flush=True)
-    try:
-        response = json.loads(stdout.strip())
-    except Exception:
-        response = {"jsonrpc": "2.0", "error": {"code": -32000, "message": "Invalid MCP server response"}}
+        response = await dispatch_rpc(body)
+        errors = [response["error"]] if "error" in response else []
+    for error in errors:
+        print("[MCP DEBUG] errore:", repr(error), file=sys.stderr, flush=True)
+    if response == [] or _is_notification(body):
+        # Solo notifiche: nessuna risposta JSON-RPC
+        return Response(status_code=204)
     return JSONResponse(content=response)
 
 @app.post("/mcp/tools")
@@ -173,7 +422,7 @@ async def call_tool(request: Request):
     body = await request.json()
     name = body.get("name")
     arguments = body.get("arguments", {})
-    response = call_mcp_server(CATALOG_SERVER, "callTool", {
+    response = await call_mcp_server(CATALOG_SERVER, "callTool", {
         "name": name,
         "arguments": arguments
     })
@@ -183,7 +432,7 @@ async def call_tool(request: Request):
 async def search_low_stock(request: Request):
     body = await request.json()
     threshold = body.get("threshold", 25)
-    response = call_mcp_server(CATALOG_SERVER, "callTool", {
+    response = await call_mcp_server(CATALOG_SERVER, "callTool", {
         "name": "catalog.searchLowStock",
         "arguments": {"threshold": threshold}
     })
@@ -195,7 +444,7 @@ async def apply_discount(request: Request):
     product_id = body.get("product_id")
     percent = body.get("percent")
     threshold = body.get("threshold", 25)
-    response = call_mcp_server(CATALOG_SERVER, "callTool", {
+    response = await call_mcp_server(CATALOG_SERVER, "callTool", {
         "name": "catalog.applyDiscount",
         "arguments": {
             "product_id": product_id,
@@ -218,7 +467,7 @@ async def reset_price(request: Request):
         threshold = body.get("threshold", 25)
         if product_id is None:
             return JSONResponse(status_code=400, content={"error": "product_id richiesto"})
-        response = call_mcp_server(CATALOG_SERVER, "callTool", {
+        response = await call_mcp_server(CATALOG_SERVER, "callTool", {
             "name": "catalog.resetPrice",
             "arguments": {
                 "product_id": product_id,
@@ -231,6 +480,6 @@ async def reset_price(request: Request):
 
 @app.get("/mcp/tools")
 async def list_tools():
-    response = call_mcp_server(CATALOG_SERVER, "listTools")
+    response = await call_mcp_server(CATALOG_SERVER, "listTools")
     return JSONResponse(content=response)
 
@@ -1,30 +1,18 @@
-import sys, json, os, requests, redis
+import sys, json, os, threading, asyncio, requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 REST_BASE = os.getenv("REST_BASE_URL", "http://localhost:8080")
-REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
-
-BASE_PRICES = {
-    1: 1499.0, 
-    2: 29.0, 
-    3: 79.0, 
-    4: 329.0, 
-    5: 119.0, 
-    6: 149.0, 
-    7: 199.0, 
-    8: 129.0,
-    9: 799.0, 
-    10: 999.0, 
-    11: 899.0, 
-    12: 649.0, 
-    13: 59.0, 
-    14: 179.0, 
-    15: 549.0,
-    16: 229.0, 
-    17: 249.0, 
-    18: 159.0, 
-    19: 399.0, 
-    20: 299.0,
-}
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "2"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.2"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+# Richieste eseguite in parallelo dal server (thread)
+MCP_MAX_IN_FLIGHT = int(os.getenv("MCP_MAX_IN_FLIGHT", "10"))
+# Id per richiesta (PATCH /products, POST /products:base-prices) nelle operazioni su tutto il catalogo
+BULK_PATCH_CHUNK = int(os.getenv("BULK_PATCH_CHUNK", "500"))
 
 def respond(id, result=None, error=None):
     msg = {"jsonrpc": "2.0", "id": id}
@@ -32,9 +20,61 @@ def respond(id, result=None, error=None):
         msg["error"] = {"code": -32000, "message": error}
     else:
         msg["result"] = result
-    sys.stdout.write(json.dumps(msg) + "\n")
+    return msg
+
+def write_message(message):
+    # Chiamata solo dall'event loop di serve(): le righe non si sovrappongono
+    sys.stdout.write(json.dumps(message) + "\n")
     sys.stdout.flush()
 
+_session = None
+_session_lock = threading.Lock()
+
+def http():
+    """
+    Sessione HTTP del processo, creata al primo uso e riusata da tutti i tool:
+    connessioni keep-alive verso api-rest e retry con backoff esponenziale su
+    errori di connessione e risposte 502/503/504 (GET e PATCH con valori
+    assoluti sono idempotenti).
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=HTTP_RETRIES,
+                backoff_factor=HTTP_BACKOFF,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset({"GET", "PATCH"}),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+def rest(method, path, **kwargs):
+    return http().request(method, f"{REST_BASE}{path}", timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT), **kwargs)
+
+def bulk_patch(changes):
+    """Applica le modifiche [{"id", "price"|"stock"}] con PATCH /products, a blocchi di BULK_PATCH_CHUNK."""
+    for start in range(0, len(changes), BULK_PATCH_CHUNK):
+        resp = rest("PATCH", "/products", json=changes[start:start + BULK_PATCH_CHUNK])
+        resp.raise_for_status()
+
+def base_prices(pids):
+    """
+    Prezzi base {id: prezzo} da api-rest (catalogo iniziale, ripristinato da /reset),
+    a blocchi di BULK_PATCH_CHUNK id: un prezzo diverso indica un prodotto già scontato.
+    """
+    prices = {}
+    for start in range(0, len(pids), BULK_PATCH_CHUNK):
+        resp = rest("POST", "/products:base-prices", json={"ids": pids[start:start + BULK_PATCH_CHUNK]})
+        resp.raise_for_status()
+        prices.update((int(pid), price) for pid, price in resp.json().items())
+    return prices
+
 def list_tools():
     return [
         {
@@ -95,6 +135,18 @@ def list_tools():
                 },
                 "required": ["product_id", "threshold"]
             }
+        },
+        {
+            "name": "catalog.searchProducts",
+            "description": "Search products by name, category or description (full-text, prefixes allowed)",
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string"},
+                    "limit": {"type": "integer"}
+                },
+                "required": ["query"]
+            }
         }
     ]
 
@@ -116,23 +168,23 @@ def handle(req):
             percent = float(args.get("percent"))
             threshold = int(args.get("threshold"))
             try:
-                redis_client = redis.Redis.from_url(REDIS_URL)
-                resp = requests.get(f"{REST_BASE}/products")
+                # Solo i prodotti sotto soglia (stock < threshold), filtrati da api-rest sull'indice dello stock
+                resp = rest("GET", "/products", params={"max_stock": threshold - 1, "fields": "id,price,stock"})
                 resp.raise_for_status()
                 products = resp.json()
+                prices = base_prices([prod["id"] for prod in products])
                 updated = []
                 already_discounted = []
                 for prod in products:
                     pid = prod["id"]
-                    base_price = BASE_PRICES.get(pid, prod["price"])
+                    base_price = prices.get(pid, prod["price"])
                     if prod["stock"] < threshold:
                         if abs(prod["price"] - base_price) < 0.01:
                             new_price = round(base_price * (1 - percent/100), 2)
-                            upd = requests.patch(f"{REST_BASE}/products/{pid}", params={"price": new_price})
-                            upd.raise_for_status()
                             updated.append({"id": pid, "old_price": base_price, "new_price": new_price})
                         else:
                             already_discounted.append({"id": pid, "current_price": prod["price"]})
+                bulk_patch([{"id": item["id"], "price": item["new_price"]} for item in updated])
                 if not updated:
                     msg = "Nessun prodotto aggiornato. Tutti i prodotti in low stock sono già scontati."
                     if already_discounted:
@@ -146,23 +198,21 @@ def handle(req):
         if tool == "catalog.resetPriceAll":
             threshold = int(args.get("threshold"))
             try:
-                redis_client = redis.Redis.from_url(REDIS_URL)
-                resp = requests.get(f"{REST_BASE}/products")
+                resp = rest("GET", "/products", params={"min_stock": threshold, "fields": "id,price,stock"})
                 resp.raise_for_status()
                 products = resp.json()
+                prices = base_prices([prod["id"] for prod in products])
                 reset = []
                 already_base = []
                 for prod in products:
                     pid = prod["id"]
-                    base_price = BASE_PRICES.get(pid, prod["price"])
+                    base_price = prices.get(pid, prod["price"])
                     if prod["stock"] >= threshold:
                         if abs(prod["price"] - base_price) > 0.01:
-                            old_price = prod["price"]
-                            upd = requests.patch(f"{REST_BASE}/products/{pid}", params={"price": base_price})
-                            upd.raise_for_status()
-                            reset.append({"id": pid, "old_price": old_price, "new_price": base_price})
+                            reset.append({"id": pid, "old_price": prod["price"], "new_price": base_price})
                         else:
                             already_base.append({"id": pid})
+                bulk_patch([{"id": item["id"], "price": item["new_price"]} for item in reset])
                 if not reset:
                     msg = "Nessun prodotto aggiornato. Tutti i prodotti in high stock sono già a prezzo base."
                     if already_base:
@@ -175,10 +225,18 @@ def handle(req):
         if tool == "catalog.searchLowStock":
             threshold = int(args.get("threshold", 25))
             try:
-                resp = requests.get(f"{REST_BASE}/products")
+                resp = rest("GET", "/products", params={"max_stock": threshold})
+                resp.raise_for_status()
+                return respond(id_, {"items": resp.json()})
+            except Exception as e:
+                return respond(id_, error=f"REST API error: {str(e)}")
+
+        if tool == "catalog.searchProducts":
+            params = {"q": args.get("query", ""), "limit": int(args.get("limit", 10))}
+            try:
+                resp = rest("GET", "/products/search", params=params)
                 resp.raise_for_status()
-                items = [p for p in resp.json() if p["stock"] <= threshold]
-                return respond(id_, {"items": items})
+                return respond(id_, {"items": resp.json()})
             except Exception as e:
                 return respond(id_, error=f"REST API error: {str(e)}")
 
@@ -187,12 +245,12 @@ def handle(req):
             percent = float(args.get("percent"))
             threshold = int(args.get("threshold"))
             try:
-                prod = requests.get(f"{REST_BASE}/products/{pid}").json()
-                base_price = BASE_PRICES.get(pid, prod["price"])
+                prod = rest("GET", f"/products/{pid}").json()
+                base_price = base_prices([pid]).get(pid, prod["price"])
                 if prod["stock"] < threshold:
                     if abs(prod["price"] - base_price) < 0.01:
                         new_price = round(base_price * (1 - percent/100), 2)
-                        upd = requests.patch(f"{REST_BASE}/products/{pid}", params={"price": new_price})
+                        upd = rest("PATCH", f"/products/{pid}", params={"price": new_price})
                         upd.raise_for_status()
                         return respond(id_, {
                             "id": pid,
@@ -211,13 +269,12 @@ def handle(req):
             pid = int(args.get("product_id"))
             threshold = int(args.get("threshold"))
             try:
-                redis_client = redis.Redis.from_url(REDIS_URL)
-                prod = requests.get(f"{REST_BASE}/products/{pid}").json()
-                base_price = BASE_PRICES.get(pid, prod["price"])
+                prod = rest("GET", f"/products/{pid}").json()
+                base_price = base_prices([pid]).get(pid, prod["price"])
                 if prod["stock"] >= threshold:
                     if abs(prod["price"] - base_price) > 0.01:
                         old_price = prod["price"]
-                        upd = requests.patch(f"{REST_BASE}/products/{pid}", params={"price": base_price})
+                        upd = rest("PATCH", f"/products/{pid}", params={"price": base_price})
                         upd.raise_for_status()
                         return respond(id_, {
                             "id": pid,
@@ -234,20 +291,76 @@ def handle(req):
         return respond(id_, error="unknown tool")
     return respond(id_, error="unknown method")
 
-def main():
-    for line in sys.stdin:
+def is_notification(req):
+    # JSON-RPC 2.0: una richiesta senza "id" è una notifica, eseguita senza risposta
+    return isinstance(req, dict) and "id" not in req
+
+def call(req):
+    """Risposta a una singola richiesta JSON-RPC (anche in caso di errore)."""
+    if not isinstance(req, dict):
+        return respond(None, error="invalid request")
+    try:
+        return handle(req)
+    except Exception as e:
+        return respond(req.get("id"), error=str(e))
+
+async def serve():
+    """
+    Legge le richieste da stdin e le esegue in parallelo (al massimo
+    MCP_MAX_IN_FLIGHT alla volta, su thread): le risposte sono scritte appena
+    pronte, anche fuori ordine, e il client le abbina tramite l'`id`.
+    Con MCP_MAX_IN_FLIGHT richieste in corso la lettura di stdin si ferma.
+
+    Una riga con un array è un batch JSON-RPC 2.0: le richieste del batch
+    sono eseguite in parallelo e le risposte scritte insieme, in un array
+    nello stesso ordine. Le notifiche (senza "id") non hanno risposta: un
+    batch di sole notifiche non produce nessuna riga.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=MCP_MAX_IN_FLIGHT)
+    slots = asyncio.Semaphore(MCP_MAX_IN_FLIGHT)
+    tasks = set()
+
+    async def run(line):
+        try:
+            try:
+                req = json.loads(line)
+            except ValueError as e:
+                write_message(respond(None, error=str(e)))
+                return
+            if isinstance(req, list):
+                if not req:
+                    write_message(respond(None, error="empty batch"))
+                    return
+                responses = await asyncio.gather(*(loop.run_in_executor(executor, call, item) for item in req))
+                responses = [resp for item, resp in zip(req, responses) if not is_notification(item)]
+                if responses:
+                    write_message(responses)
+            else:
+                response = await loop.run_in_executor(executor, call, req)
+                if not is_notification(req):
+                    write_message(response)
+        finally:
+            slots.release()
+
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line:
+            break
         line = line.strip()
         if not line:
             continue
-        try:
-            req = json.loads(line)
-            handle(req)
-        except Exception as e:
-            sys.stdout.write(json.dumps({
-                "jsonrpc": "2.0",
-                "error": {"code": -32000, "message": str(e)}
-            }) + "\n")
-            sys.stdout.flush()
+        await slots.acquire()
+        task = asyncio.create_task(run(line))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    # Fine di stdin: si completano le richieste ancora in corso
+    if tasks:
+        await asyncio.gather(*tasks)
+    executor.shutdown()
+
+def main():
+    asyncio.run(serve())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
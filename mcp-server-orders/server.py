@@ -1,4 +1,5 @@
-import sys, json, os, redis
+import sys, json, os, threading, asyncio, redis
+from concurrent.futures import ThreadPoolExecutor
 
 
 
@@ -6,7 +7,41 @@ if os.getenv("REDIS_URL"):
     REDIS_URL = os.getenv("REDIS_URL")
 else:
     REDIS_URL = "redis://localhost:6379/0"
-r = redis.Redis.from_url(REDIS_URL)
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", "20"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "1.0"))
+REDIS_COMMAND_TIMEOUT = float(os.getenv("REDIS_COMMAND_TIMEOUT", "0.5"))
+# Richieste eseguite in parallelo dal server (thread)
+MCP_MAX_IN_FLIGHT = int(os.getenv("MCP_MAX_IN_FLIGHT", "10"))
+# Stesso trasporto degli eventi di api-rest (pubsub o stream)
+EVENTS_TRANSPORT = os.getenv("EVENTS_TRANSPORT", "pubsub")
+EVENTS_STREAM = os.getenv("EVENTS_STREAM", "events:stream")
+EVENTS_STREAM_MAXLEN = int(os.getenv("EVENTS_STREAM_MAXLEN", "100000"))
+
+_redis = None
+_redis_lock = threading.Lock()
+
+def redis_client():
+    """Client Redis del processo con il proprio pool di connessioni, creato al primo uso."""
+    global _redis
+    with _redis_lock:
+        if _redis is None:
+            pool = redis.ConnectionPool.from_url(
+                REDIS_URL,
+                max_connections=REDIS_POOL_SIZE,
+                socket_timeout=REDIS_COMMAND_TIMEOUT,
+                socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+                health_check_interval=30,
+            )
+            _redis = redis.Redis(connection_pool=pool)
+    return _redis
+
+def publish_event(event):
+    message = json.dumps(event)
+    r = redis_client()
+    if EVENTS_TRANSPORT == "stream":
+        r.xadd(EVENTS_STREAM, {"data": message}, maxlen=EVENTS_STREAM_MAXLEN, approximate=True)
+    else:
+        r.publish("events", message)
 
 def respond(id, result=None, error=None):
     msg = {"jsonrpc": "2.0", "id": id}
@@ -14,7 +49,11 @@ def respond(id, result=None, error=None):
         msg["error"] = {"code": -32000, "message": error}
     else:
         msg["result"] = result
-    sys.stdout.write(json.dumps(msg) + "\n")
+    return msg
+
+def write_message(message):
+    # Chiamata solo dall'event loop di serve(): le righe non si sovrappongono
+    sys.stdout.write(json.dumps(message) + "\n")
     sys.stdout.flush()
 
 def list_tools():
@@ -48,10 +87,10 @@ def handle(req):
         if tool == "orders.notifyPending":
             pid = int(args.get("product_id"))
             try:
-                r.publish("events", json.dumps({
+                publish_event({
                     "type": "notify_pending",
                     "product_id": pid
-                }))
+                })
                 return respond(id_, {
                     "status": "notified",
                     "product_id": pid,
@@ -63,20 +102,76 @@ def handle(req):
         return respond(id_, error="unknown tool")
     return respond(id_, error="unknown method")
 
-def main():
-    for line in sys.stdin:
+def is_notification(req):
+    # JSON-RPC 2.0: una richiesta senza "id" è una notifica, eseguita senza risposta
+    return isinstance(req, dict) and "id" not in req
+
+def call(req):
+    """Risposta a una singola richiesta JSON-RPC (anche in caso di errore)."""
+    if not isinstance(req, dict):
+        return respond(None, error="invalid request")
+    try:
+        return handle(req)
+    except Exception as e:
+        return respond(req.get("id"), error=str(e))
+
+async def serve():
+    """
+    Legge le richieste da stdin e le esegue in parallelo (al massimo
+    MCP_MAX_IN_FLIGHT alla volta, su thread): le risposte sono scritte appena
+    pronte, anche fuori ordine, e il client le abbina tramite l'`id`.
+    Con MCP_MAX_IN_FLIGHT richieste in corso la lettura di stdin si ferma.
+
+    Una riga con un array è un batch JSON-RPC 2.0: le richieste del batch
+    sono eseguite in parallelo e le risposte scritte insieme, in un array
+    nello stesso ordine. Le notifiche (senza "id") non hanno risposta: un
+    batch di sole notifiche non produce nessuna riga.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=MCP_MAX_IN_FLIGHT)
+    slots = asyncio.Semaphore(MCP_MAX_IN_FLIGHT)
+    tasks = set()
+
+    async def run(line):
+        try:
+            try:
+                req = json.loads(line)
+            except ValueError as e:
+                write_message(respond(None, error=str(e)))
+                return
+            if isinstance(req, list):
+                if not req:
+                    write_message(respond(None, error="empty batch"))
+                    return
+                responses = await asyncio.gather(*(loop.run_in_executor(executor, call, item) for item in req))
+                responses = [resp for item, resp in zip(req, responses) if not is_notification(item)]
+                if responses:
+                    write_message(responses)
+            else:
+                response = await loop.run_in_executor(executor, call, req)
+                if not is_notification(req):
+                    write_message(response)
+        finally:
+            slots.release()
+
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line:
+            break
         line = line.strip()
         if not line:
             continue
-        try:
-            req = json.loads(line)
-            handle(req)
-        except Exception as e:
-            sys.stdout.write(json.dumps({
-                "jsonrpc": "2.0",
-                "error": {"code": -32000, "message": str(e)}
-            }) + "\n")
-            sys.stdout.flush()
+        await slots.acquire()
+        task = asyncio.create_task(run(line))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    # Fine di stdin: si completano le richieste ancora in corso
+    if tasks:
+        await asyncio.gather(*tasks)
+    executor.shutdown()
+
+def main():
+    asyncio.run(serve())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,107 @@
+import requests
+import statistics
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+MCP_BASE = "http://localhost:5000"
+CONCURRENCY_LEVELS = [1, 4, 16, 32]
+REQUESTS_PER_LEVEL = 64
+OUTPUT_FILE = "test-12-mcp-host-concurrency.json"
+
+# Mix di chiamate sui tre tipi di endpoint: /rpc, /mcp/* (catalog) e orders
+CALLS = [
+    ("POST", "/rpc", {"jsonrpc": "2.0", "id": 1, "method": "callTool",
+                      "params": {"name": "catalog.searchLowStock", "arguments": {"threshold": 25}}}),
+    ("POST", "/mcp/search-low-stock", {"threshold": 25}),
+    ("GET", "/mcp/tools", None),
+    ("POST", "/rpc", {"jsonrpc": "2.0", "id": 2, "method": "callTool",
+                      "params": {"name": "orders.notifyPending", "arguments": {"product_id": 1}}}),
+]
+
+
+def check_services():
+    try:
+        r = requests.get(MCP_BASE + "/health", timeout=3)
+        if r.status_code != 200:
+            print("[ERRORE] mcp-host non disponibile")
+            return False
+        return True
+    except Exception as e:
+        print(f"[ERRORE] Servizi non disponibili: {e}")
+        return False
+
+def single_call(i):
+    method, path, body = CALLS[i % len(CALLS)]
+    start = time.time()
+    try:
+        if method == "GET":
+            r = requests.get(MCP_BASE + path, timeout=30)
+        else:
+            r = requests.post(MCP_BASE + path, json=body, timeout=30)
+        latency = (time.time() - start) * 1000
+        return latency, r.status_code == 200
+    except Exception:
+        return (time.time() - start) * 1000, False
+
+def execute_level(concurrency):
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(single_call, range(REQUESTS_PER_LEVEL)))
+    wall = (time.time() - start) * 1000
+    latencies = [lat for lat, ok in outcomes if ok]
+    failures = sum(1 for _, ok in outcomes if not ok)
+    return latencies, failures, wall
+
+def calculate_stats(latencies):
+    if not latencies:
+        return {"count": 0, "p50": 0, "p95": 0, "p99": 0, "mean": 0, "min": 0, "max": 0}
+    sorted_lat = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "p50": statistics.median(latencies),
+        "p95": sorted_lat[int(0.95 * len(latencies))-1],
+        "p99": sorted_lat[int(0.99 * len(latencies))-1],
+        "mean": statistics.mean(latencies),
+        "min": min(latencies),
+        "max": max(latencies)
+    }
+
+def main():
+    print("=" * 70)
+    print("TEST 12: mcp-host - Concorrenza richieste MCP", flush=True)
+    print("=" * 70)
+    if not check_services():
+        print("Servizi non disponibili. Esci.")
+        return
+    levels = {}
+    for concurrency in CONCURRENCY_LEVELS:
+        print(f"[MCP] Concorrenza {concurrency}...", flush=True)
+        latencies, failures, wall = execute_level(concurrency)
+        # overlap ~ 1 se le richieste si accodano una dietro l'altra, ~ concorrenza se si sovrappongono
+        overlap = round(sum(latencies) / wall, 2) if wall else 0
+        levels[str(concurrency)] = {
+            "results": calculate_stats(latencies),
+            "wall_ms": round(wall, 2),
+            "throughput": round(len(latencies) / (wall / 1000), 2) if wall else 0,
+            "overlap": overlap,
+            "failures": failures
+        }
+        print(f"  wall={wall:.0f}ms overlap={overlap}", flush=True)
+    results = {
+        "test": "mcp-host - Concorrenza richieste MCP",
+        "data": datetime.now().isoformat(),
+        "requests_per_level": REQUESTS_PER_LEVEL,
+        "levels": levels
+    }
+    output_dir = os.path.join(os.path.dirname(__file__), '..', 'risultati-misurazioni')
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, OUTPUT_FILE)
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nRisultati salvati: {output_path}")
+
+if __name__ == "__main__":
+    main()
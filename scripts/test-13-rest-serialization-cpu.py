@@ -0,0 +1,92 @@
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import List
+
+# Micro-benchmark in-process: non richiede i container, importa direttamente api-rest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api-rest'))
+import main as api
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+CATALOG_SIZES = [20, 10_000, 100_000]
+REPETITIONS = 20
+OUTPUT_FILE = "test-13-rest-serialization-cpu.json"
+
+LEGACY_FIELD = create_model_field(name="Response", type_=List[api.Product], mode="serialization")
+
+
+def build_catalog(size):
+    products = [api.Product(**p) for p in api.BASE_PRODUCTS.values()]
+    for pid in range(len(products) + 1, size + 1):
+        products.append(api.Product(
+            id=pid,
+            name=f"Product {pid}",
+            price=float(10 + pid % 990),
+            stock=pid % 300,
+            category=f"category-{pid % 50}",
+            description=f"Synthetic product {pid} for serialization benchmark",
+        ))
+    api.DB_PRODUCTS.load(products[:size])
+    api.ENCODED_PRODUCTS.clear()
+
+
+def legacy_body(items):
+    # Percorso precedente: validazione response_model + jsonable_encoder + JSONResponse
+    content = asyncio.run(serialize_response(field=LEGACY_FIELD, response_content=items, is_coroutine=True))
+    return JSONResponse(content).body
+
+
+def cpu_ms(fn, setup=None):
+    samples = []
+    for _ in range(REPETITIONS):
+        if setup:
+            setup()
+        start = time.process_time()
+        fn()
+        samples.append((time.process_time() - start) * 1000)
+    return {"p50": statistics.median(samples), "mean": statistics.mean(samples), "min": min(samples)}
+
+
+def touch_one_product():
+    # Una PATCH invalida il corpo in cache ma un solo frammento prodotto
+    api.DB_PRODUCTS.update(1, stock=api.DB_PRODUCTS.get(1).stock + 1)
+
+
+def main():
+    print("=" * 70)
+    print("TEST 13: CPU per richiesta GET /products (serializzazione)", flush=True)
+    print("=" * 70)
+    sizes = {}
+    for size in CATALOG_SIZES:
+        print(f"[Catalogo] {size} prodotti...", flush=True)
+        build_catalog(size)
+        items = api.DB_PRODUCTS.query()
+        assert legacy_body(items) == api.encode_products(items), "output diverso dal percorso FastAPI"
+        sizes[str(size)] = {
+            "legacy_response_model": cpu_ms(lambda: legacy_body(api.DB_PRODUCTS.query())),
+            "fast_cold": cpu_ms(lambda: api.encode_products(api.DB_PRODUCTS.query()), setup=api.ENCODED_PRODUCTS.clear),
+            "fast_after_patch": cpu_ms(lambda: api.encode_products(api.DB_PRODUCTS.query()), setup=touch_one_product),
+        }
+        for name, stats in sizes[str(size)].items():
+            print(f"  {name}: p50={stats['p50']:.2f}ms", flush=True)
+    results = {
+        "test": "CPU per richiesta GET /products (serializzazione)",
+        "data": datetime.now().isoformat(),
+        "repetitions": REPETITIONS,
+        "results": sizes
+    }
+    output_dir = os.path.join(os.path.dirname(__file__), '..', 'risultati-misurazioni')
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, OUTPUT_FILE)
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nRisultati salvati: {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+# Benchmark in-process: confronta il vecchio middleware @app.middleware("http")
+# con il middleware ASGI puro di api-rest, chiamando le app ASGI direttamente
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api-rest'))
+import main as api
+from fastapi import FastAPI, Request
+
+REQUESTS = 5000
+CONCURRENCY = 50
+OUTPUT_FILE = "test-14-rest-middleware-rps.json"
+
+# Entrambe le varianti scrivono i log su /dev/null per non misurare il terminale
+DEVNULL = open(os.devnull, "w")
+api.logHandler.setStream(DEVNULL)
+
+legacy_logger = logging.getLogger("api-rest-legacy")
+legacy_handler = logging.StreamHandler(DEVNULL)
+legacy_handler.setFormatter(api.formatter)
+legacy_logger.addHandler(legacy_handler)
+legacy_logger.setLevel(logging.INFO)
+legacy_logger.propagate = False
+
+
+def build_legacy_app():
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def logging_middleware(request: Request, call_next):
+        request_id = request.headers.get("X-Request-ID", str(uuid.uuid4()))
+        trace_id = request.headers.get("X-Trace-ID", request_id)
+        start_time = time.time()
+        legacy_logger.info("Request started", extra={"request_id": request_id, "trace_id": trace_id,
+                                                     "method": request.method, "path": request.url.path})
+        response = await call_next(request)
+        duration = time.time() - start_time
+        legacy_logger.info("Request completed", extra={"request_id": request_id, "trace_id": trace_id,
+                                                       "method": request.method, "path": request.url.path,
+                                                       "status": response.status_code,
+                                                       "duration_ms": round(duration * 1000, 2)})
+        response.headers["X-Request-ID"] = request_id
+        response.headers["X-Trace-ID"] = trace_id
+        return response
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+def build_asgi_app(sample_rate):
+    app = FastAPI()
+    app.add_middleware(api.RequestLoggingMiddleware, start_sample_rate=sample_rate)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def call(app):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/ping", "raw_path": b"/ping", "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.sleep(3600)
+        received = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def run(app):
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one():
+        async with semaphore:
+            await call(app)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(REQUESTS)))
+    elapsed = time.perf_counter() - start
+    return round(REQUESTS / elapsed, 1)
+
+
+def main():
+    print("=" * 70)
+    print("TEST 14: api-rest - Middleware logging/metriche (richieste/s)", flush=True)
+    print("=" * 70)
+    variants = {
+        "legacy_http_middleware": build_legacy_app(),
+        "asgi_middleware": build_asgi_app(1.0),
+        "asgi_middleware_sampled_10pct": build_asgi_app(0.1),
+    }
+    results = {}
+    for name, app in variants.items():
+        asyncio.run(run(app))  # warm-up
+        results[name] = asyncio.run(run(app))
+        print(f"  {name}: {results[name]} req/s", flush=True)
+    output = {
+        "test": "api-rest - Middleware logging/metriche",
+        "data": datetime.now().isoformat(),
+        "requests": REQUESTS,
+        "concurrency": CONCURRENCY,
+        "results": results
+    }
+    output_dir = os.path.join(os.path.dirname(__file__), '..', 'risultati-misurazioni')
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, OUTPUT_FILE)
+    with open(output_path, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"\nRisultati salvati: {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import requests
+
+# Avvia api-rest in locale (serve Redis su REDIS_URL) con 1, 2, 4 e 8 worker
+# e misura il throughput di lettura e la visibilità delle PATCH tra i worker
+API_DIR = os.path.join(os.path.dirname(__file__), '..', 'api-rest')
+PORT = 8090
+BASE = f"http://localhost:{PORT}"
+WORKER_COUNTS = [1, 2, 4, 8]
+CLIENT_PROCESSES = 8
+DURATION_S = 10
+VISIBILITY_PROBES = 50
+OUTPUT_FILE = "test-15-rest-multiworker.json"
+
+
+def start_server(workers):
+    env = dict(os.environ, API_WORKERS=str(workers), PORT=str(PORT), SHARED_CATALOG="true",
+               RATE_LIMIT="1000000/minute", LOG_START_SAMPLE_RATE="0")
+    proc = subprocess.Popen([sys.executable, "main.py"], cwd=API_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if requests.get(BASE + "/health", timeout=1).status_code == 200:
+                return proc
+        except Exception:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError(f"api-rest non avviato con {workers} worker")
+
+
+def read_loop(seed):
+    # Ogni processo client usa connessioni keep-alive e percorre prodotti diversi
+    session = requests.Session()
+    count = errors = 0
+    pid = seed
+    deadline = time.time() + DURATION_S
+    while time.time() < deadline:
+        pid = pid % 20 + 1
+        try:
+            if session.get(f"{BASE}/products/{pid}", timeout=5).status_code == 200:
+                count += 1
+            else:
+                errors += 1
+        except Exception:
+            errors += 1
+    return count, errors
+
+
+def measure_reads():
+    with ProcessPoolExecutor(max_workers=CLIENT_PROCESSES) as pool:
+        outcomes = list(pool.map(read_loop, range(CLIENT_PROCESSES)))
+    count = sum(c for c, _ in outcomes)
+    errors = sum(e for _, e in outcomes)
+    return round(count / DURATION_S, 1), errors
+
+
+def measure_visibility():
+    # Dopo una PATCH, tempo finché N letture consecutive (su connessioni nuove, quindi worker diversi) la vedono
+    lags = []
+    stale_reads = 0
+    for i in range(VISIBILITY_PROBES):
+        stock = 1000 + i
+        start = time.time()
+        requests.patch(f"{BASE}/products/1?stock={stock}", timeout=5)
+        consecutive = 0
+        while consecutive < 8 and time.time() - start < 5:
+            if requests.get(f"{BASE}/products/1", timeout=5).json()["stock"] == stock:
+                consecutive += 1
+            else:
+                consecutive = 0
+                stale_reads += 1
+        lags.append((time.time() - start) * 1000)
+    lags.sort()
+    return {"p50_ms": round(lags[len(lags) // 2], 2), "max_ms": round(lags[-1], 2), "stale_reads": stale_reads}
+
+
+def main():
+    print("=" * 70)
+    print("TEST 15: api-rest - Scalabilità multi-worker con catalogo condiviso", flush=True)
+    print("=" * 70)
+    levels = {}
+    for workers in WORKER_COUNTS:
+        print(f"[REST] {workers} worker...", flush=True)
+        proc = start_server(workers)
+        try:
+            requests.post(BASE + "/reset", timeout=5)
+            rps, errors = measure_reads()
+            visibility = measure_visibility()
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+        levels[str(workers)] = {"read_rps": rps, "errors": errors, "patch_visibility": visibility}
+        print(f"  {rps} req/s, errori={errors}, visibilità PATCH p50={visibility['p50_ms']}ms", flush=True)
+    results = {
+        "test": "api-rest - Scalabilità multi-worker con catalogo condiviso",
+        "data": datetime.now().isoformat(),
+        "client_processes": CLIENT_PROCESSES,
+        "duration_s": DURATION_S,
+        "cpu_count": os.cpu_count(),
+        "levels": levels
+    }
+    output_dir = os.path.join(os.path.dirname(__file__), '..', 'risultati-misurazioni')
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, OUTPUT_FILE)
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nRisultati salvati: {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Benchmark in-process: tempo di avvio di api-rest con il backend WAL
+# (snapshot memory-mapped + replay del WAL) rispetto alla ricostruzione del catalogo
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api-rest'))
+from main import Product
+from persistence import WalBackend, open_store
+from store import ProductStore
+
+CATALOG_SIZE = 1_000_000
+WAL_ENTRIES = 50_000
+OUTPUT_FILE = "test-16-rest-store-startup.json"
+
+
+def synthetic_catalog(size):
+    return [
+        {
+            "id": pid,
+            "name": f"Product {pid}",
+            "price": float(10 + pid % 990),
+            "stock": pid % 300,
+            "category": f"category-{pid % 50}",
+            "description": f"Synthetic product {pid}",
+        }
+        for pid in range(1, size + 1)
+    ]
+
+
+async def prepare(directory, rows):
+    store = ProductStore()
+    backend = WalBackend(directory, store, Product, snapshot_every=WAL_ENTRIES * 2)
+    await backend.open([])
+    await backend.reset([Product(**row) for row in rows])
+    for i in range(WAL_ENTRIES):
+        await backend.write([(i % CATALOG_SIZE + 1, i % 500, None)])
+    await backend.close()
+
+
+async def start_from_wal(directory):
+    store = ProductStore()
+    backend = WalBackend(directory, store, Product, snapshot_every=WAL_ENTRIES * 2)
+    start = time.perf_counter()
+    await open_store(store, backend, [])
+    elapsed = time.perf_counter() - start
+    await backend.close()
+    return round(elapsed, 2), len(store)
+
+
+def rebuild(rows):
+    start = time.perf_counter()
+    store = ProductStore(Product(**row) for row in rows)
+    return round(time.perf_counter() - start, 2), len(store)
+
+
+def main():
+    print("=" * 70)
+    print(f"TEST 16: api-rest - Avvio con {CATALOG_SIZE} prodotti (snapshot + WAL)", flush=True)
+    print("=" * 70)
+    rows = synthetic_catalog(CATALOG_SIZE)
+    directory = tempfile.mkdtemp(prefix="api-rest-wal-")
+    try:
+        print("[WAL] Preparazione snapshot e WAL...", flush=True)
+        asyncio.run(prepare(directory, rows))
+        snapshot_mb = round(os.path.getsize(os.path.join(directory, WalBackend.SNAPSHOT)) / 1e6, 1)
+        print("[WAL] Avvio con replay del WAL...", flush=True)
+        first, count = asyncio.run(start_from_wal(directory))
+        assert count == CATALOG_SIZE
+        print(f"  {first}s", flush=True)
+        print("[WAL] Avvio dopo la compattazione...", flush=True)
+        compacted, _ = asyncio.run(start_from_wal(directory))
+        print(f"  {compacted}s", flush=True)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print("[Rebuild] Ricostruzione completa del catalogo...", flush=True)
+    rebuild_s, _ = rebuild(rows)
+    print(f"  {rebuild_s}s", flush=True)
+    results = {
+        "test": "api-rest - Avvio con catalogo persistente",
+        "data": datetime.now().isoformat(),
+        "catalog_size": CATALOG_SIZE,
+        "wal_entries": WAL_ENTRIES,
+        "snapshot_mb": snapshot_mb,
+        "results": {
+            "wal_with_replay_s": first,
+            "wal_compacted_s": compacted,
+            "rebuild_s": rebuild_s,
+        }
+    }
+    output_dir = os.path.join(os.path.dirname(__file__), '..', 'risultati-misurazioni')
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, OUTPUT_FILE)
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nRisultati salvati: {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import os
+import statistics
+import time
+from datetime import datetime
+
+import requests
+
+# Latenza PATCH -> client per N client SSE concorrenti su /events/stream.
+# Le connessioni contano per il rate limit di api-rest: avviarlo con un limite alto,
+# es. RATE_LIMIT=100000/minute docker compose up -d api-rest
+HOST = "localhost"
+PORT = 8080
+BASE = f"http://{HOST}:{PORT}"
+CLIENTS = 1000
+EVENTS = 20
+EVENT_INTERVAL_S = 0.5
+STOCK_BASE = 5000
+OUTPUT_FILE = "test-17-sse-latency.json"
+
+
+def check_services():
+    try:
+        r = requests.get(BASE + "/health", timeout=3)
+        if r.status_code != 200:
+            print("[ERRORE] api-rest non disponibile")
+            return False
+        return True
+    except Exception as e:
+        print(f"[ERRORE] Servizi non disponibili: {e}")
+        return False
+
+
+async def sse_client(ready, received, stop):
+    # Client HTTP minimale su socket asyncio: migliaia di connessioni in un solo processo
+    reader, writer = await asyncio.open_connection(HOST, PORT)
+    writer.write(f"GET /events/stream HTTP/1.1\r\nHost: {HOST}\r\nAccept: text/event-stream\r\n\r\n".encode())
+    await writer.drain()
+    status = await reader.readline()
+    if b" 200 " not in status:
+        writer.close()
+        raise RuntimeError(status.decode().strip())
+    while await reader.readline() not in (b"\r\n", b""):
+        pass
+    ready()
+    try:
+        while not stop.is_set():
+            line = await reader.readline()
+            if not line:
+                break
+            if line.startswith(b"data:"):
+                now = time.perf_counter()
+                event = json.loads(line[5:])
+                if event.get("type") == "stock_update" and event.get("id") == 1:
+                    received.append((event["stock"], now))
+    finally:
+        writer.close()
+
+
+async def run():
+    connected = 0
+    all_ready = asyncio.Event()
+
+    def ready():
+        nonlocal connected
+        connected += 1
+        if connected == CLIENTS:
+            all_ready.set()
+
+    received = []
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(sse_client(ready, received, stop)) for _ in range(CLIENTS)]
+    try:
+        await asyncio.wait_for(all_ready.wait(), 60)
+    except asyncio.TimeoutError:
+        failed = [t for t in tasks if t.done() and t.exception()]
+        print(f"[ERRORE] {connected}/{CLIENTS} client connessi ({failed[0].exception() if failed else 'timeout'})")
+    print(f"[SSE] {connected} client connessi", flush=True)
+
+    sent = {}
+    for i in range(EVENTS):
+        stock = STOCK_BASE + i
+        sent[stock] = time.perf_counter()
+        await asyncio.to_thread(requests.patch, f"{BASE}/products/1?stock={stock}", timeout=5)
+        await asyncio.sleep(EVENT_INTERVAL_S)
+    await asyncio.sleep(2)
+    stop.set()
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies = [(t - sent[stock]) * 1000 for stock, t in received if stock in sent]
+    return connected, latencies
+
+
+def calculate_stats(latencies):
+    if not latencies:
+        return {"count": 0, "p50": 0, "p95": 0, "p99": 0, "mean": 0, "max": 0}
+    sorted_lat = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "p50": statistics.median(latencies),
+        "p95": sorted_lat[int(0.95 * len(latencies)) - 1],
+        "p99": sorted_lat[int(0.99 * len(latencies)) - 1],
+        "mean": statistics.mean(latencies),
+        "max": max(latencies)
+    }
+
+
+def main():
+    print("=" * 70)
+    print(f"TEST 17: api-rest - Latenza SSE con {CLIENTS} client", flush=True)
+    print("=" * 70)
+    if not check_services():
+        print("Servizi non disponibili. Esci.")
+        return
+    requests.post(BASE + "/reset", timeout=5)
+    connected, latencies = asyncio.run(run())
+    stats = calculate_stats(latencies)
+    expected = connected * EVENTS
+    print(f"  ricevuti {len(latencies)}/{expected} eventi, p50={stats['p50']:.1f}ms p99={stats['p99']:.1f}ms", flush=True)
+    results = {
+        "test": "api-rest - Latenza SSE PATCH -> client",
+        "data": datetime.now().isoformat(),
+        "clients": CLIENTS,
+        "connected": connected,
+        "events": EVENTS,
+        "delivery_ratio": round(len(latencies) / expected, 4) if expected else 0,
+        "results": stats
+    }
+    output_dir = os.path.join(os.path.dirname(__file__), '..', 'risultati-misurazioni')
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, OUTPUT_FILE)
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nRisultati salvati: {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import redis.asyncio as aioredis
+
+# Benchmark in-process su Redis (localhost:6379): throughput di pubblicazione degli
+# eventi con EventPublisher di api-rest, pub/sub contro Redis Stream (XADD MAXLEN ~),
+# e verifica che un consumer dello stream riprenda dall'ultimo id senza perdere eventi
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api-rest'))
+from events import EVENTS_CHANNEL, EventPublisher, EventReader
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+STREAM_KEY = "bench:events:stream"
+CONCURRENCY = [1, 10, 100]
+EVENTS_PER_RUN = 20000
+RESUME_EVENTS = 1000
+OUTPUT_FILE = "test-18-events-throughput.json"
+
+
+def event(i):
+    return (EVENTS_CHANNEL, json.dumps({"type": "stock_update", "id": i % 20 + 1, "stock": i}))
+
+
+async def publish_run(redis, transport, concurrency):
+    await redis.delete(STREAM_KEY)
+    publisher = EventPublisher(redis, transport, stream_key=STREAM_KEY, maxlen=EVENTS_PER_RUN)
+    per_client = EVENTS_PER_RUN // concurrency
+
+    async def client(c):
+        # Ogni client simula richieste PATCH in sequenza: un evento per richiesta
+        for i in range(per_client):
+            await publisher.publish([event(c * per_client + i)])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return round(per_client * concurrency / elapsed)
+
+
+async def resume_check(redis):
+    """Il consumer si ferma a metà, gli eventi continuano ad arrivare, poi riprende dall'ultimo id."""
+    await redis.delete(STREAM_KEY)
+    publisher = EventPublisher(redis, "stream", stream_key=STREAM_KEY)
+    reader = EventReader(redis, "stream", stream_key=STREAM_KEY, last_id="0-0")
+    received = []
+    await publisher.publish([event(i) for i in range(RESUME_EVENTS // 2)])
+    async with reader:
+        while len(received) < RESUME_EVENTS // 2:
+            received.extend(await reader.read(timeout=1.0))
+    await publisher.publish([event(i) for i in range(RESUME_EVENTS // 2, RESUME_EVENTS)])
+    async with reader:
+        while len(received) < RESUME_EVENTS:
+            messages = await reader.read(timeout=1.0)
+            if not messages:
+                break
+            received.extend(messages)
+    stocks = [json.loads(data)["stock"] for _, data in received]
+    return stocks == list(range(RESUME_EVENTS))
+
+
+async def run():
+    redis = aioredis.from_url(REDIS_URL)
+    try:
+        await redis.ping()
+    except Exception as e:
+        print(f"[ERRORE] Redis non disponibile: {e}")
+        return None
+    results = {}
+    try:
+        for transport in ("pubsub", "stream"):
+            results[transport] = {}
+            for concurrency in CONCURRENCY:
+                rate = await publish_run(redis, transport, concurrency)
+                results[transport][str(concurrency)] = rate
+                print(f"  {transport:6} concurrency={concurrency:<4} {rate} eventi/s", flush=True)
+        results["resume_ok"] = await resume_check(redis)
+        print(f"  ripresa dall'ultimo id: {'OK' if results['resume_ok'] else 'eventi persi'}", flush=True)
+    finally:
+        await redis.delete(STREAM_KEY)
+        await redis.aclose()
+    return results
+
+
+def main():
+    print("=" * 70)
+    print("TEST 18: Eventi - Throughput pub/sub vs Redis Stream", flush=True)
+    print("=" * 70)
+    results = asyncio.run(run())
+    if results is None:
+        print("Servizi non disponibili. Esci.")
+        return
+    output = {
+        "test": "Eventi - Throughput pub/sub vs Redis Stream",
+        "data": datetime.now().isoformat(),
+        "events_per_run": EVENTS_PER_RUN,
+        "results": results
+    }
+    output_dir = os.path.join(os.path.dirname(__file__), '..', 'risultati-misurazioni')
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, OUTPUT_FILE)
+    with open(output_path, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"\nRisultati salvati: {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+# Benchmark in-process della ricerca full-text di api-rest (/products/search):
+# costruzione dell'indice invertito, memoria occupata e latenza delle query su 1M prodotti
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api-rest'))
+from main import Product
+from store import ProductStore
+
+CATALOG_SIZE = 1_000_000
+REPEAT = 200
+LIMIT = 20
+OUTPUT_FILE = "test-19-rest-search.json"
+
+WORDS = ["laptop", "mouse", "keyboard", "monitor", "headset", "webcam", "ssd", "router", "tablet", "charger"]
+ADJECTIVES = ["wireless", "pro", "ultra", "compact", "gaming", "portable", "silent"]
+
+QUERIES = {
+    "token_raro": "product 123456",
+    "token_comune": "wireless",
+    "prefisso": "key",
+    "due_termini": "gaming mouse",
+    "tre_termini_prefisso": "portable ssd prod",
+    "intersezione_ampia": "category-3 mouse",
+    "nessun_risultato": "zzzz",
+}
+
+
+def synthetic_catalog(size):
+    for pid in range(1, size + 1):
+        word = WORDS[pid % len(WORDS)]
+        adjective = ADJECTIVES[pid % len(ADJECTIVES)]
+        yield Product(
+            id=pid,
+            name=f"{adjective.title()} {word.title()} {pid}",
+            price=float(10 + pid % 990),
+            stock=pid % 300,
+            category=f"category-{pid % 50}",
+            description=f"Synthetic product {pid}: {adjective} {word}",
+        )
+
+
+def rss_mb():
+    # Memoria residente attuale del processo (Linux)
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def calculate_stats(latencies):
+    sorted_lat = sorted(latencies)
+    return {
+        "p50": round(statistics.median(latencies), 3),
+        "p95": round(sorted_lat[int(0.95 * len(latencies)) - 1], 3),
+        "p99": round(sorted_lat[int(0.99 * len(latencies)) - 1], 3),
+        "max": round(max(latencies), 3),
+    }
+
+
+def main():
+    print("=" * 70)
+    print(f"TEST 19: api-rest - Ricerca full-text su {CATALOG_SIZE} prodotti", flush=True)
+    print("=" * 70)
+    store = ProductStore(synthetic_catalog(CATALOG_SIZE))
+    gc.collect()
+    before = rss_mb()
+    start = time.perf_counter()
+    store.search_index()
+    build_s = round(time.perf_counter() - start, 2)
+    gc.collect()
+    index_mb = round(rss_mb() - before, 1)
+    print(f"[Indice] costruito in {build_s}s, {index_mb} MB", flush=True)
+
+    results = {}
+    for label, query in QUERIES.items():
+        latencies = []
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            found = store.search(query, LIMIT)
+            latencies.append((time.perf_counter() - start) * 1000)
+        stats = calculate_stats(latencies)
+        stats["results"] = len(found)
+        results[label] = stats
+        print(f"  {label:22} q={query!r:22} p50={stats['p50']}ms p99={stats['p99']}ms ({len(found)} risultati)", flush=True)
+
+    output = {
+        "test": "api-rest - Ricerca full-text con indice invertito",
+        "data": datetime.now().isoformat(),
+        "catalog_size": CATALOG_SIZE,
+        "limit": LIMIT,
+        "index_build_s": build_s,
+        "index_memory_mb": index_mb,
+        "results": results
+    }
+    output_dir = os.path.join(os.path.dirname(__file__), '..', 'risultati-misurazioni')
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, OUTPUT_FILE)
+    with open(output_path, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"\nRisultati salvati: {output_path}")
+
+if __name__ == "__main__":
+    main()
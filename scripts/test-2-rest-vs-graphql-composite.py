@@ -7,6 +7,7 @@ from datetime import datetime
 
 REST_URL = "http://localhost:8080/products/"
 REST_REC_URL = "http://localhost:8080/products/{}/recommendations"
+REST_BATCH_URL = "http://localhost:8080/products:batch"
 GRAPHQL_URL = "http://localhost:4000/"
 ITERATIONS = 40
 
@@ -84,6 +85,31 @@ def execute_rest():
             successes += 1
     return latencies, successes, failures
 
+def execute_rest_batch():
+    latencies = []
+    successes = 0
+    failures = 0
+    for i in range(ITERATIONS):
+        # Stessi 5 prodotti con raccomandazioni incorporate, in un solo round trip
+        product_ids = [((i * 5 + j) % 20) + 1 for j in range(5)]
+        params = {"ids": ",".join(str(pid) for pid in product_ids), "recommendations": 3}
+        start = time.time()
+        try:
+            r = requests.get(REST_BATCH_URL, params=params, timeout=5)
+            latency = (time.time() - start) * 1000
+            if r.status_code == 200 and len(r.json()["products"]) == len(product_ids):
+                latencies.append(latency)
+                successes += 1
+            elif r.status_code == 429:
+                print("Rate limited, attesa 60s...")
+                time.sleep(60)
+                continue
+            else:
+                failures += 1
+        except Exception:
+            failures += 1
+    return latencies, successes, failures
+
 def execute_graphql():
     latencies = []
     successes = 0
@@ -156,6 +182,9 @@ def main():
     print("[REST] Avvio test...", flush=True)
     rest_lat, rest_succ, rest_fail = execute_rest()
     rest_stats = calculate_stats(rest_lat)
+    print("[REST batch] Avvio test...", flush=True)
+    batch_lat, batch_succ, batch_fail = execute_rest_batch()
+    batch_stats = calculate_stats(batch_lat)
     print("[GraphQL] Avvio test...", flush=True)
     gql_lat, gql_succ, gql_fail = execute_graphql()
     gql_stats = calculate_stats(gql_lat)
@@ -171,6 +200,7 @@ def main():
         },
         "results": {
             "rest": rest_stats,
+            "rest_batch": batch_stats,
             "graphql": gql_stats
         },
         "comparison": {
@@ -178,8 +208,8 @@ def main():
             "winner": "GraphQL" if speedup > 0 else "REST",
             "conclusion": "GraphQL riduce round-trip su query composte" if speedup > 0 else "REST più veloce"
         },
-        "successes": {"rest": rest_succ, "graphql": gql_succ},
-        "failures": {"rest": rest_fail, "graphql": gql_fail}
+        "successes": {"rest": rest_succ, "rest_batch": batch_succ, "graphql": gql_succ},
+        "failures": {"rest": rest_fail, "rest_batch": batch_fail, "graphql": gql_fail}
     }
     output_file = save_results(results, OUTPUT_FILE)
     print(f"\nRisultati salvati: {output_file}")
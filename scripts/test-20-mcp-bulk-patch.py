@@ -0,0 +1,128 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import requests
+
+# Latenza di catalog.applyDiscountAll e catalog.resetPriceAll (mcp-server-catalog) al crescere
+# del catalogo: una PATCH /products a blocchi contro una PATCH per prodotto (comportamento precedente).
+# Avvia api-rest in locale con CATALOG_SIZE prodotti e il server MCP come processo stdio.
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+API_DIR = os.path.join(ROOT, 'api-rest')
+CATALOG_SERVER = os.path.join(ROOT, 'mcp-server-catalog', 'server.py')
+PORT = 8091
+BASE = f"http://localhost:{PORT}"
+CATALOG_SIZES = [20, 1000, 10000, 50000]
+REPEAT = 3
+PERCENT = 10
+THRESHOLD = 25
+OUTPUT_FILE = "test-20-mcp-bulk-patch.json"
+
+
+def start_api(catalog_size):
+    env = dict(os.environ, PORT=str(PORT), CATALOG_SIZE=str(catalog_size),
+               RATE_LIMIT="1000000/minute", LOG_START_SAMPLE_RATE="0")
+    proc = subprocess.Popen([sys.executable, "main.py"], cwd=API_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if requests.get(BASE + "/health", timeout=1).status_code == 200:
+                return proc
+        except Exception:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError(f"api-rest non avviato con {catalog_size} prodotti")
+
+
+def start_mcp():
+    env = dict(os.environ, REST_BASE_URL=BASE)
+    return subprocess.Popen([sys.executable, CATALOG_SERVER], env=env, text=True,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+
+def call_tool(mcp, name, arguments):
+    request = {"jsonrpc": "2.0", "id": 1, "method": "callTool", "params": {"name": name, "arguments": arguments}}
+    start = time.perf_counter()
+    mcp.stdin.write(json.dumps(request) + "\n")
+    mcp.stdin.flush()
+    response = json.loads(mcp.stdout.readline())
+    elapsed = (time.perf_counter() - start) * 1000
+    if "error" in response:
+        raise RuntimeError(response["error"]["message"])
+    return elapsed, response["result"].get("count", 0)
+
+
+def per_product_discount(session):
+    # Riproduce il comportamento precedente: lettura del catalogo e una PATCH per prodotto
+    start = time.perf_counter()
+    products = session.get(f"{BASE}/products").json()
+    count = 0
+    for prod in products:
+        if prod["stock"] < THRESHOLD:
+            new_price = round(prod["price"] * (1 - PERCENT / 100), 2)
+            session.patch(f"{BASE}/products/{prod['id']}", params={"price": new_price}).raise_for_status()
+            count += 1
+    return (time.perf_counter() - start) * 1000, count
+
+
+def measure(catalog_size):
+    proc = start_api(catalog_size)
+    mcp = start_mcp()
+    session = requests.Session()
+    timings = {"bulk_discount_ms": [], "bulk_reset_ms": [], "per_product_discount_ms": []}
+    try:
+        for _ in range(REPEAT):
+            session.post(f"{BASE}/reset").raise_for_status()
+            elapsed, changed = call_tool(mcp, "catalog.applyDiscountAll", {"percent": PERCENT, "threshold": THRESHOLD})
+            timings["bulk_discount_ms"].append(elapsed)
+            elapsed, _ = call_tool(mcp, "catalog.resetPriceAll", {"threshold": 0})
+            timings["bulk_reset_ms"].append(elapsed)
+            session.post(f"{BASE}/reset").raise_for_status()
+            elapsed, _ = per_product_discount(session)
+            timings["per_product_discount_ms"].append(elapsed)
+    finally:
+        mcp.stdin.close()
+        mcp.wait(timeout=5)
+        proc.terminate()
+        proc.wait(timeout=10)
+    result = {name: round(statistics.median(values), 1) for name, values in timings.items()}
+    result["changed_products"] = changed
+    return result
+
+
+def main():
+    print("=" * 70)
+    print("TEST 20: MCP catalog - applyDiscountAll/resetPriceAll con PATCH /products a blocchi", flush=True)
+    print("=" * 70)
+    results = {}
+    for size in CATALOG_SIZES:
+        print(f"[Catalogo] {size} prodotti...", flush=True)
+        try:
+            results[str(size)] = measure(size)
+        except Exception as e:
+            print(f"[ERRORE] {e}")
+            return
+        r = results[str(size)]
+        print(f"  {r['changed_products']} prodotti scontati: bulk {r['bulk_discount_ms']}ms "
+              f"(reset {r['bulk_reset_ms']}ms), per prodotto {r['per_product_discount_ms']}ms", flush=True)
+    output = {
+        "test": "MCP catalog - Operazioni su tutto il catalogo, bulk vs per prodotto",
+        "data": datetime.now().isoformat(),
+        "repeat": REPEAT,
+        "results": results
+    }
+    output_dir = os.path.join(ROOT, 'risultati-misurazioni')
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, OUTPUT_FILE)
+    with open(output_path, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"\nRisultati salvati: {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import requests
+
+# Latenza per chiamata dei tool di mcp-server-catalog con un processo server di lunga durata
+# (come il pool di mcp-host): la sessione HTTP keep-alive riusa le connessioni verso api-rest.
+# Per confronto misura anche la stessa GET con una nuova connessione a ogni chiamata (requests.get).
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+API_DIR = os.path.join(ROOT, 'api-rest')
+CATALOG_SERVER = os.path.join(ROOT, 'mcp-server-catalog', 'server.py')
+PORT = 8092
+BASE = f"http://localhost:{PORT}"
+CATALOG_SIZE = 1000
+REPEAT = 500
+OUTPUT_FILE = "test-21-mcp-session-latency.json"
+
+# applyDiscount e resetPrice si alternano: ogni chiamata fa GET + PATCH su api-rest
+TOOLS = {
+    "searchProducts": [("catalog.searchProducts", {"query": "product 7", "limit": 5})],
+    "searchLowStock": [("catalog.searchLowStock", {"threshold": 5})],
+    "applyDiscount/resetPrice": [
+        ("catalog.applyDiscount", {"product_id": 1, "percent": 10, "threshold": 100000}),
+        ("catalog.resetPrice", {"product_id": 1, "threshold": 0}),
+    ],
+}
+
+
+def start_api():
+    env = dict(os.environ, PORT=str(PORT), CATALOG_SIZE=str(CATALOG_SIZE),
+               RATE_LIMIT="1000000/minute", LOG_START_SAMPLE_RATE="0")
+    proc = subprocess.Popen([sys.executable, "main.py"], cwd=API_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if requests.get(BASE + "/health", timeout=1).status_code == 200:
+                return proc
+        except Exception:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError("api-rest non avviato")
+
+
+def start_mcp():
+    env = dict(os.environ, REST_BASE_URL=BASE)
+    return subprocess.Popen([sys.executable, CATALOG_SERVER], env=env, text=True,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+
+def call_tool(mcp, name, arguments):
+    request = {"jsonrpc": "2.0", "id": 1, "method": "callTool", "params": {"name": name, "arguments": arguments}}
+    start = time.perf_counter()
+    mcp.stdin.write(json.dumps(request) + "\n")
+    mcp.stdin.flush()
+    response = json.loads(mcp.stdout.readline())
+    elapsed = (time.perf_counter() - start) * 1000
+    if "error" in response:
+        raise RuntimeError(response["error"]["message"])
+    return elapsed
+
+
+def calculate_stats(latencies):
+    sorted_lat = sorted(latencies)
+    return {
+        "first": round(latencies[0], 3),
+        "p50": round(statistics.median(latencies), 3),
+        "p95": round(sorted_lat[int(0.95 * len(latencies)) - 1], 3),
+        "p99": round(sorted_lat[int(0.99 * len(latencies)) - 1], 3),
+    }
+
+
+def http_baseline():
+    # Stessa GET fatta dal tool applyDiscount: nuova connessione a ogni chiamata contro sessione keep-alive
+    results = {}
+    session = requests.Session()
+    for label, get in (("connessione_per_chiamata", requests.get), ("sessione_keep_alive", session.get)):
+        latencies = []
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            get(f"{BASE}/products/1").raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+        results[label] = calculate_stats(latencies)
+    return results
+
+
+def main():
+    print("=" * 70)
+    print("TEST 21: MCP catalog - Latenza per chiamata con sessione HTTP condivisa", flush=True)
+    print("=" * 70)
+    try:
+        proc = start_api()
+    except Exception as e:
+        print(f"[ERRORE] {e}")
+        return
+    mcp = start_mcp()
+    results = {}
+    try:
+        for label, calls in TOOLS.items():
+            latencies = [call_tool(mcp, *calls[i % len(calls)]) for i in range(REPEAT)]
+            results[label] = calculate_stats(latencies)
+            r = results[label]
+            print(f"  {label:26} prima={r['first']}ms p50={r['p50']}ms p95={r['p95']}ms p99={r['p99']}ms", flush=True)
+        http = http_baseline()
+        for label, r in http.items():
+            print(f"  GET {label:26} p50={r['p50']}ms p99={r['p99']}ms", flush=True)
+    finally:
+        mcp.stdin.close()
+        mcp.wait(timeout=5)
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    output = {
+        "test": "MCP catalog - Latenza per chiamata con processo di lunga durata e sessione HTTP keep-alive",
+        "data": datetime.now().isoformat(),
+        "catalog_size": CATALOG_SIZE,
+        "repeat": REPEAT,
+        "tools": results,
+        "http_get": http
+    }
+    output_dir = os.path.join(ROOT, 'risultati-misurazioni')
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, OUTPUT_FILE)
+    with open(output_path, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"\nRisultati salvati: {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+# Throughput di mcp-server-catalog con molte richieste JSON-RPC in pipeline su stdin:
+# con MCP_MAX_IN_FLIGHT=1 il server esegue una richiesta alla volta (comportamento precedente),
+# con valori più alti le chiamate REST si sovrappongono e le risposte escono fuori ordine.
+# Avvia api-rest in locale; il server MCP lo raggiunge tramite un proxy TCP che aggiunge
+# LATENCY_MS a ogni richiesta, come una chiamata REST su rete.
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+API_DIR = os.path.join(ROOT, 'api-rest')
+CATALOG_SERVER = os.path.join(ROOT, 'mcp-server-catalog', 'server.py')
+PORT = 8093
+PROXY_PORT = 8094
+BASE = f"http://localhost:{PORT}"
+LATENCY_MS = 5
+IN_FLIGHT = [1, 4, 10, 32]
+REQUESTS = 1000
+REPEAT = 3
+OUTPUT_FILE = "test-22-mcp-pipelined-throughput.json"
+
+# Tool misti: ricerca, lettura filtrata e GET + PATCH su un prodotto
+TOOLS = [
+    ("catalog.searchProducts", {"query": "mouse", "limit": 5}),
+    ("catalog.searchLowStock", {"threshold": 5}),
+    ("catalog.applyDiscount", {"product_id": 2, "percent": 10, "threshold": 100000}),
+    ("catalog.resetPrice", {"product_id": 2, "threshold": 0}),
+]
+
+
+def start_api():
+    env = dict(os.environ, PORT=str(PORT), RATE_LIMIT="1000000/minute", LOG_START_SAMPLE_RATE="0")
+    proc = subprocess.Popen([sys.executable, "main.py"], cwd=API_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if requests.get(BASE + "/health", timeout=1).status_code == 200:
+                return proc
+        except Exception:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError("api-rest non avviato")
+
+
+def start_proxy():
+    async def pipe(reader, writer, delay):
+        try:
+            while data := await reader.read(65536):
+                if delay:
+                    await asyncio.sleep(delay)
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle(client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection("localhost", PORT)
+        await asyncio.gather(pipe(client_reader, server_writer, LATENCY_MS / 1000),
+                             pipe(server_reader, client_writer, 0))
+
+    async def serve(ready):
+        server = await asyncio.start_server(handle, "localhost", PROXY_PORT)
+        ready.set()
+        await server.serve_forever()
+
+    ready = threading.Event()
+    threading.Thread(target=lambda: asyncio.run(serve(ready)), daemon=True).start()
+    ready.wait(5)
+
+
+def start_mcp(in_flight):
+    env = dict(os.environ, REST_BASE_URL=f"http://localhost:{PROXY_PORT}", MCP_MAX_IN_FLIGHT=str(in_flight), HTTP_POOL_SIZE=str(in_flight))
+    return subprocess.Popen([sys.executable, CATALOG_SERVER], env=env, text=True,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+
+def pipelined_run(mcp):
+    # Tutte le richieste scritte di seguito (da un thread, per non bloccarsi sulla pipe di stdout)
+    lines = []
+    for i in range(REQUESTS):
+        name, arguments = TOOLS[i % len(TOOLS)]
+        lines.append(json.dumps({"jsonrpc": "2.0", "id": i, "method": "callTool",
+                                 "params": {"name": name, "arguments": arguments}}) + "\n")
+
+    def writer():
+        for line in lines:
+            mcp.stdin.write(line)
+        mcp.stdin.flush()
+
+    start = time.perf_counter()
+    thread = threading.Thread(target=writer)
+    thread.start()
+    ids = []
+    errors = 0
+    for _ in range(REQUESTS):
+        response = json.loads(mcp.stdout.readline())
+        ids.append(response["id"])
+        errors += "error" in response
+    elapsed = time.perf_counter() - start
+    thread.join()
+    if sorted(ids) != list(range(REQUESTS)):
+        raise RuntimeError("risposte mancanti o duplicate")
+    out_of_order = sum(1 for a, b in zip(ids, ids[1:]) if b < a)
+    return REQUESTS / elapsed, out_of_order, errors
+
+
+def main():
+    print("=" * 70)
+    print(f"TEST 22: MCP catalog - {REQUESTS} richieste in pipeline al variare di MCP_MAX_IN_FLIGHT", flush=True)
+    print("=" * 70)
+    try:
+        api = start_api()
+    except Exception as e:
+        print(f"[ERRORE] {e}")
+        return
+    start_proxy()
+    results = {}
+    try:
+        for in_flight in IN_FLIGHT:
+            mcp = start_mcp(in_flight)
+            runs = []
+            try:
+                for _ in range(REPEAT):
+                    requests.post(f"{BASE}/reset").raise_for_status()
+                    runs.append(pipelined_run(mcp))
+            finally:
+                mcp.stdin.close()
+                mcp.wait(timeout=10)
+            results[str(in_flight)] = {
+                "requests_per_sec": round(statistics.median(r[0] for r in runs), 1),
+                "out_of_order": runs[-1][1],
+                "errors": sum(r[2] for r in runs),
+            }
+            r = results[str(in_flight)]
+            print(f"  in volo {in_flight:3}: {r['requests_per_sec']} req/s, "
+                  f"{r['out_of_order']} risposte fuori ordine, {r['errors']} errori", flush=True)
+    finally:
+        api.terminate()
+        api.wait(timeout=10)
+
+    output = {
+        "test": "MCP catalog - Richieste JSON-RPC in pipeline, esecuzione concorrente",
+        "data": datetime.now().isoformat(),
+        "requests": REQUESTS,
+        "latency_ms": LATENCY_MS,
+        "repeat": REPEAT,
+        "results": results
+    }
+    output_dir = os.path.join(ROOT, 'risultati-misurazioni')
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, OUTPUT_FILE)
+    with open(output_path, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"\nRisultati salvati: {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import redis.asyncio as aioredis
+
+# Verifica in-process del rate limiter di api-rest (ratelimit.Limiter): script Lua GCRA su Redis
+# e fast path locale con richieste prenotate. Usa Redis su REDIS_URL; se non raggiungibile e fakeredis (con lupa)
+# è installato, usa un Redis in-process, così la verifica è ripetibile anche senza container.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api-rest'))
+from events import CircuitBreaker
+from ratelimit import Limiter, RateLimit
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+ATTEMPTS = 300
+OUTPUT_FILE = "test-23-rest-ratelimit-gcra.json"
+
+
+async def connect():
+    client = aioredis.from_url(REDIS_URL, socket_connect_timeout=1)
+    try:
+        await client.ping()
+        return client, "redis"
+    except Exception:
+        await client.aclose()
+    try:
+        import fakeredis
+    except ImportError:
+        raise RuntimeError(f"Redis non raggiungibile su {REDIS_URL} e fakeredis non installato")
+    return fakeredis.aioredis.FakeRedis(), "fakeredis"
+
+
+def count_round_trips(limiter):
+    # Conta le esecuzioni dello script Lua (un round trip Redis ciascuna)
+    calls = [0]
+    script = limiter._script
+
+    async def counted(*args, **kwargs):
+        calls[0] += 1
+        return await script(*args, **kwargs)
+
+    limiter._script = counted
+    return calls
+
+
+async def burst(limiters, key, limit, attempts):
+    """Richieste consecutive sulla stessa chiave, alternando i limiter (worker diversi)."""
+    admitted = 0
+    retry_after = None
+    start = time.monotonic()
+    for i in range(attempts):
+        wait = await limiters[i % len(limiters)].hit(key, limit)
+        if wait is None:
+            admitted += 1
+        elif retry_after is None:
+            retry_after = wait
+    elapsed_ms = (time.monotonic() - start) * 1000
+    # Tolleranza: richieste riemesse dal GCRA nel tempo trascorso durante il test
+    allowance = limit.amount + int(elapsed_ms / limit.interval_ms) + 1
+    return admitted, retry_after, allowance
+
+
+async def check_gcra(redis):
+    """Solo script Lua (local_fraction=0): ammesse esattamente `amount` richieste, poi 429 con retry_after."""
+    limit = RateLimit("10/second")
+    limiter = Limiter(redis, local_fraction=0)
+    key = "test23:gcra"
+    await redis.delete(key)
+    admitted, retry_after, allowance = await burst([limiter], key, limit, 30)
+    await asyncio.sleep(limit.interval_ms / 1000 + 0.02)
+    after_wait = await limiter.hit(key, limit)
+    ok = limit.amount <= admitted <= allowance and retry_after is not None \
+        and 0 < retry_after <= limit.interval_ms / 1000 and after_wait is None
+    return {"ok": ok, "admitted": admitted, "limit": limit.amount,
+            "retry_after_s": round(retry_after or 0, 3), "admitted_after_wait": after_wait is None}
+
+
+async def check_fast_path(redis):
+    """
+    Fast path locale: le prime `amount` richieste sono tutte ammesse con pochi round trip
+    (richieste prenotate su Redis), le successive respinte come senza fast path.
+    """
+    limit = RateLimit("100/minute")
+    limiter = Limiter(redis, local_fraction=0.5)
+    calls = count_round_trips(limiter)
+    key = "test23:fast"
+    await redis.delete(key)
+    within, _, _ = await burst([limiter], key, limit, limit.amount)
+    round_trips = calls[0]
+    beyond, _, allowance = await burst([limiter], key, limit, ATTEMPTS - limit.amount)
+    admitted = within + beyond
+    ok = within == limit.amount and admitted <= allowance and round_trips < limit.amount // 4
+    return {"ok": ok, "admitted": admitted, "limit": limit.amount, "attempts": ATTEMPTS,
+            "redis_round_trips_within_limit": round_trips}
+
+
+async def check_workers(redis):
+    """Quattro limiter sulla stessa chiave (come quattro worker): il limite resta globale."""
+    limit = RateLimit("100/minute")
+    limiters = [Limiter(redis, local_fraction=0.5) for _ in range(4)]
+    key = "test23:workers"
+    await redis.delete(key)
+    admitted, _, allowance = await burst(limiters, key, limit, ATTEMPTS)
+    # Ogni worker concede localmente solo richieste già prenotate su Redis
+    ok = limit.amount <= admitted <= allowance
+    return {"ok": ok, "admitted": admitted, "limit": limit.amount, "workers": len(limiters)}
+
+
+async def check_concurrent(redis):
+    """
+    Richieste concorrenti sulla stessa chiave nello stesso worker: le prenotazioni
+    ottenute in parallelo si sommano, quindi sono ammesse tutte le `amount` richieste.
+    """
+    limit = RateLimit("100/minute")
+    results = {}
+    for callers, per_caller in ((10, 10), (25, 4)):
+        limiter = Limiter(redis, local_fraction=0.5)
+        key = f"test23:concurrent:{callers}"
+        await redis.delete(key)
+        start = time.monotonic()
+        counts = await asyncio.gather(*(burst([limiter], key, limit, per_caller) for _ in range(callers)))
+        elapsed_ms = (time.monotonic() - start) * 1000
+        admitted = sum(c[0] for c in counts)
+        results[f"{callers}x{per_caller}"] = admitted
+        allowance = limit.amount + int(elapsed_ms / limit.interval_ms) + 1
+        results.setdefault("ok", True)
+        results["ok"] &= limit.amount <= admitted <= allowance
+    return {"ok": results.pop("ok"), "limit": limit.amount, "admitted": results}
+
+
+async def check_fail_open():
+    """
+    Redis non raggiungibile: le richieste sono ammesse (fail open) e, aperto il
+    circuito, lo script non viene più tentato.
+    """
+    redis = aioredis.from_url("redis://localhost:1/0", socket_connect_timeout=0.2)
+    breaker = CircuitBreaker(failures=3, reset_timeout=60)
+    limiter = Limiter(redis, breaker=breaker)
+    calls = count_round_trips(limiter)
+    results = [await limiter.hit("test23:down", RateLimit("1/minute")) for _ in range(10)]
+    await redis.aclose()
+    ok = results == [None] * len(results) and calls[0] == breaker.failures
+    return {"ok": ok, "admitted": results.count(None), "attempts": len(results), "redis_attempts": calls[0]}
+
+
+async def run():
+    redis, backend = await connect()
+    try:
+        results = {
+            "gcra_lua": await check_gcra(redis),
+            "fast_path_locale": await check_fast_path(redis),
+            "worker_multipli": await check_workers(redis),
+            "concorrenti": await check_concurrent(redis),
+            "fail_open": await check_fail_open(),
+        }
+    finally:
+        await redis.aclose()
+    return backend, results
+
+
+def main():
+    print("=" * 70)
+    print("TEST 23: api-rest - Rate limiter GCRA (script Lua) e fast path locale", flush=True)
+    print("=" * 70)
+    try:
+        backend, results = asyncio.run(run())
+    except Exception as e:
+        print(f"[ERRORE] {e}")
+        return
+    print(f"[Redis] {backend}")
+    for name, result in results.items():
+        detail = ", ".join(f"{k}={v}" for k, v in result.items() if k != "ok")
+        print(f"  {'OK ' if result['ok'] else 'KO '} {name:18} {detail}", flush=True)
+
+    output = {
+        "test": "api-rest - Rate limiter GCRA e fast path locale",
+        "data": datetime.now().isoformat(),
+        "redis": backend,
+        "passed": all(r["ok"] for r in results.values()),
+        "results": results
+    }
+    output_dir = os.path.join(os.path.dirname(__file__), '..', 'risultati-misurazioni')
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, OUTPUT_FILE)
+    with open(output_path, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"\nRisultati salvati: {output_path}")
+    if not output["passed"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import requests
+
+# Verifica dei tool di sconto di mcp-server-catalog su prodotti sintetici (id oltre i 20 prodotti base):
+# il prezzo base arriva da api-rest (POST /products:base-prices), quindi un secondo sconto sullo
+# stesso prodotto non si somma al primo e il ripristino torna al prezzo del catalogo iniziale.
+# Avvia api-rest in locale con CATALOG_SIZE prodotti e il server MCP come processo stdio.
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+API_DIR = os.path.join(ROOT, 'api-rest')
+CATALOG_SERVER = os.path.join(ROOT, 'mcp-server-catalog', 'server.py')
+PORT = 8091
+BASE = f"http://localhost:{PORT}"
+CATALOG_SIZE = 1000
+# Prodotto sintetico con stock 21 (stock = id % 300): in low stock con soglia 25
+PRODUCT_ID = 21
+PERCENT = 10
+THRESHOLD = 25
+OUTPUT_FILE = "test-24-mcp-discount-base-price.json"
+
+
+def start_api():
+    env = dict(os.environ, PORT=str(PORT), CATALOG_SIZE=str(CATALOG_SIZE),
+               RATE_LIMIT="1000000/minute", LOG_START_SAMPLE_RATE="0")
+    proc = subprocess.Popen([sys.executable, "main.py"], cwd=API_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if requests.get(BASE + "/health", timeout=1).status_code == 200:
+                return proc
+        except Exception:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError(f"api-rest non avviato con {CATALOG_SIZE} prodotti")
+
+
+def start_mcp():
+    env = dict(os.environ, REST_BASE_URL=BASE)
+    return subprocess.Popen([sys.executable, CATALOG_SERVER], env=env, text=True,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+
+def call_tool(mcp, name, arguments):
+    request = {"jsonrpc": "2.0", "id": 1, "method": "callTool", "params": {"name": name, "arguments": arguments}}
+    mcp.stdin.write(json.dumps(request) + "\n")
+    mcp.stdin.flush()
+    response = json.loads(mcp.stdout.readline())
+    if "error" in response:
+        raise RuntimeError(response["error"]["message"])
+    return response["result"]
+
+
+def check_single(mcp, session, base_price):
+    """applyDiscount due volte sullo stesso prodotto: il secondo sconto non viene applicato."""
+    call_tool(mcp, "catalog.applyDiscount", {"product_id": PRODUCT_ID, "percent": PERCENT, "threshold": THRESHOLD})
+    first = session.get(f"{BASE}/products/{PRODUCT_ID}").json()["price"]
+    call_tool(mcp, "catalog.applyDiscount", {"product_id": PRODUCT_ID, "percent": PERCENT, "threshold": THRESHOLD})
+    second = session.get(f"{BASE}/products/{PRODUCT_ID}").json()["price"]
+    call_tool(mcp, "catalog.resetPrice", {"product_id": PRODUCT_ID, "threshold": 0})
+    restored = session.get(f"{BASE}/products/{PRODUCT_ID}").json()["price"]
+    expected = round(base_price * (1 - PERCENT / 100), 2)
+    ok = first == expected and second == expected and restored == base_price
+    return {"ok": ok, "base_price": base_price, "after_first": first, "after_second": second, "after_reset": restored}
+
+
+def check_bulk(mcp, session):
+    """applyDiscountAll due volte: il secondo passaggio non modifica nessun prodotto."""
+    before = {p["id"]: p["price"] for p in session.get(f"{BASE}/products").json()}
+    first = call_tool(mcp, "catalog.applyDiscountAll", {"percent": PERCENT, "threshold": THRESHOLD})
+    second = call_tool(mcp, "catalog.applyDiscountAll", {"percent": PERCENT, "threshold": THRESHOLD})
+    call_tool(mcp, "catalog.resetPriceAll", {"threshold": 0})
+    after = {p["id"]: p["price"] for p in session.get(f"{BASE}/products").json()}
+    synthetic = sum(1 for item in first.get("updated", []) if item["id"] > 20)
+    ok = synthetic > 0 and second.get("count", 0) == 0 and after == before
+    return {"ok": ok, "discounted": first.get("count", 0), "discounted_synthetic": synthetic,
+            "discounted_again": second.get("count", 0), "restored": after == before}
+
+
+def run():
+    proc = start_api()
+    mcp = start_mcp()
+    session = requests.Session()
+    try:
+        session.post(f"{BASE}/reset").raise_for_status()
+        base_price = session.get(f"{BASE}/products/{PRODUCT_ID}").json()["price"]
+        return {
+            "sconto_singolo": check_single(mcp, session, base_price),
+            "sconto_catalogo": check_bulk(mcp, session),
+        }
+    finally:
+        mcp.stdin.close()
+        mcp.wait(timeout=5)
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    print("=" * 70)
+    print(f"TEST 24: MCP catalog - Sconti ripetuti su prodotti sintetici ({CATALOG_SIZE} prodotti)", flush=True)
+    print("=" * 70)
+    try:
+        results = run()
+    except Exception as e:
+        print(f"[ERRORE] {e}")
+        return
+    for name, result in results.items():
+        detail = ", ".join(f"{k}={v}" for k, v in result.items() if k != "ok")
+        print(f"  {'OK ' if result['ok'] else 'KO '} {name:16} {detail}", flush=True)
+
+    output = {
+        "test": "MCP catalog - Prezzo base dei prodotti sintetici negli sconti",
+        "data": datetime.now().isoformat(),
+        "catalog_size": CATALOG_SIZE,
+        "passed": all(r["ok"] for r in results.values()),
+        "results": results
+    }
+    output_dir = os.path.join(ROOT, 'risultati-misurazioni')
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, OUTPUT_FILE)
+    with open(output_path, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"\nRisultati salvati: {output_path}")
+    if not output["passed"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
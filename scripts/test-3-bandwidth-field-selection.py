@@ -56,6 +56,9 @@ def main():
     print("[REST] Lista prodotti...", flush=True)
     rest_resp = requests.get(REST_URL, timeout=5)
     rest_payload, rest_headers, rest_total = get_payload_info(rest_resp)
+    print("[REST] 3 campi (?fields=id,name,price)...", flush=True)
+    rest_sel_resp = requests.get(REST_URL, params={"fields": "id,name,price"}, timeout=5)
+    rest_sel_payload, rest_sel_headers, rest_sel_total = get_payload_info(rest_sel_resp)
     print("[GraphQL] Tutti campi...", flush=True)
     query_all = """{ products { id name price stock category description } }"""
     gql_all_resp = graphql_query(query_all)
@@ -67,6 +70,8 @@ def main():
     print("[REST] Singolo prodotto...", flush=True)
     rest_single_resp = requests.get(REST_SINGLE_URL, timeout=5)
     rest_single_payload, rest_single_headers, rest_single_total = get_payload_info(rest_single_resp)
+    rest_single_sel_resp = requests.get(REST_SINGLE_URL, params={"fields": "id,name,price"}, timeout=5)
+    rest_single_sel_payload, rest_single_sel_headers, rest_single_sel_total = get_payload_info(rest_single_sel_resp)
     print("[GraphQL] Singolo prodotto...", flush=True)
     query_single = """{ product(id: 1) { id name price stock category description } }"""
     gql_single_resp = graphql_query(query_single)
@@ -107,6 +112,8 @@ def main():
     reduction_5 = round((rest_5_total_payload - gql_5_sel_payload) / rest_5_total_payload * 100, 1) if rest_5_total_payload else 0
 
     reduction_2 = round((rest_single_payload - gql_single_sel_payload) / rest_single_payload * 100, 1) if rest_single_payload else 0
+    rest_reduction = round((rest_payload - rest_sel_payload) / rest_payload * 100, 1) if rest_payload else 0
+    rest_reduction_2 = round((rest_single_payload - rest_single_sel_payload) / rest_single_payload * 100, 1) if rest_single_payload else 0
     results = {
         "test": "Bandwidth Efficiency - Field Selection",
         "data": datetime.now().isoformat(),
@@ -119,13 +126,17 @@ def main():
                 "rest": {"payload": rest_payload, "headers": rest_headers, "total": rest_total},
                 "graphql_all": {"payload": gql_all_payload, "headers": gql_all_headers, "total": gql_all_total},
                 "graphql_selective": {"payload": gql_sel_payload, "headers": gql_sel_headers, "total": gql_sel_total},
-                "reduction_percent": reduction
+                "rest_selective": {"payload": rest_sel_payload, "headers": rest_sel_headers, "total": rest_sel_total},
+                "reduction_percent": reduction,
+                "rest_reduction_percent": rest_reduction
             },
             "scenario_2": {
                 "rest": {"payload": rest_single_payload, "headers": rest_single_headers, "total": rest_single_total},
                 "graphql_all": {"payload": gql_single_payload, "headers": gql_single_headers, "total": gql_single_total},
                 "graphql_selective": {"payload": gql_single_sel_payload, "headers": gql_single_sel_headers, "total": gql_single_sel_total},
-                "reduction_percent": reduction_2
+                "rest_selective": {"payload": rest_single_sel_payload, "headers": rest_single_sel_headers, "total": rest_single_sel_total},
+                "reduction_percent": reduction_2,
+                "rest_reduction_percent": rest_reduction_2
             },
             "scenario_3": {
                 "rest_5": {"payload": rest_5_total_payload, "headers": rest_5_total_headers, "total": rest_5_total},
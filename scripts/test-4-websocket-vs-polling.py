@@ -9,6 +9,7 @@ import threading
 
 REST_URL = "http://localhost:8080/products/1"
 PATCH_URL = "http://localhost:8080/products/1"
+CHANGES_URL = "http://localhost:8080/products/changes"
 WS_URL = "ws://localhost:7070"
 ITERATIONS = 20
 OUTPUT_FILE = "test-4-websocket-vs-polling.json"
@@ -72,6 +73,8 @@ def polling_test():
     latencies = []
     successes = 0
     failures = 0
+    # Polling condizionale: con If-None-Match api-rest risponde 304 senza corpo finché il prodotto non cambia
+    etag = None
     for i in range(ITERATIONS):
         stock_val = 98 if i % 2 == 0 else 99
         try:
@@ -80,8 +83,12 @@ def polling_test():
             t1 = time.time()
             for attempt in range(10):
                 time.sleep(1)
-                r = requests.get(REST_URL, timeout=5)
+                r = requests.get(REST_URL, headers={"If-None-Match": etag} if etag else None, timeout=5)
+                if r.status_code == 304:
+                    print(f"[Polling][{i+1}/{ITERATIONS}] Tentativo {attempt+1}: 304 Not Modified")
+                    continue
                 if r.status_code == 200:
+                    etag = r.headers.get("ETag")
                     data = r.json()
                     print(f"[Polling][{i+1}/{ITERATIONS}] Tentativo {attempt+1}: stock={data.get('stock', 0)} (atteso {stock_val})")
                     if data.get("stock", 0) == stock_val:
@@ -98,6 +105,43 @@ def polling_test():
             failures += 1
     return latencies, successes, failures
 
+def change_feed_test():
+    latencies = []
+    successes = 0
+    failures = 0
+    payload_bytes = []
+    # Feed incrementale: si scaricano solo i prodotti modificati dopo l'ultima seq vista
+    feed = requests.get(CHANGES_URL, timeout=5).json()
+    seq, epoch = feed["seq"], feed["epoch"]
+    for i in range(ITERATIONS):
+        stock_val = 96 if i % 2 == 0 else 97
+        try:
+            requests.patch(PATCH_URL + f"?stock={stock_val}", timeout=5)
+            time.sleep(0.5)
+            t1 = time.time()
+            for attempt in range(10):
+                time.sleep(1)
+                r = requests.get(CHANGES_URL, params={"since": seq, "epoch": epoch, "fields": "id,stock"}, timeout=5)
+                payload_bytes.append(len(r.content))
+                data = r.json()
+                seq, epoch = data["seq"], data["epoch"]
+                if data["resync"]:
+                    print(f"[Feed][{i+1}/{ITERATIONS}] Resync richiesto")
+                    continue
+                changed = {p["id"]: p["stock"] for p in data["changes"]}
+                print(f"[Feed][{i+1}/{ITERATIONS}] Tentativo {attempt+1}: {len(changed)} prodotti modificati")
+                if changed.get(1) == stock_val:
+                    latencies.append((time.time() - t1) * 1000)
+                    successes += 1
+                    break
+            else:
+                print(f"[Feed][{i+1}/{ITERATIONS}] Fallito: modifica non ricevuta dopo 10s")
+                failures += 1
+        except Exception as e:
+            print(f"[Feed][{i+1}/{ITERATIONS}] Errore: {e}")
+            failures += 1
+    return latencies, successes, failures, payload_bytes
+
 def calculate_stats(latencies):
     if not latencies:
         return {"count": 0, "p50": 0, "mean": 0, "min": 0, "max": 0}
@@ -134,6 +178,11 @@ def main():
     poll_lat, poll_succ, poll_fail = polling_test()
     poll_stats = calculate_stats(poll_lat)
     print("[Polling] COMPLETATO\n", flush=True)
+    print("[Feed] Avvio test /products/changes...", flush=True)
+    feed_lat, feed_succ, feed_fail, feed_bytes = change_feed_test()
+    feed_stats = calculate_stats(feed_lat)
+    feed_stats["mean_payload_bytes"] = round(statistics.mean(feed_bytes), 1) if feed_bytes else 0
+    print("[Feed] COMPLETATO\n", flush=True)
     ratio = round(poll_stats["p50"] / ws_stats["p50"], 1) if ws_stats["p50"] else 0
     results = {
         "test": "WebSocket vs Polling HTTP",
@@ -141,15 +190,16 @@ def main():
         "iterations": ITERATIONS,
         "results": {
             "websocket": ws_stats,
-            "polling": poll_stats
+            "polling": poll_stats,
+            "change_feed": feed_stats
         },
         "comparison": {
             "ratio": ratio,
             "winner": "WebSocket" if ratio > 1 else "Polling",
             "conclusion": "WebSocket più veloce per notifiche real-time" if ratio > 1 else "Polling più veloce"
         },
-        "successes": {"websocket": ws_succ, "polling": poll_succ},
-        "failures": {"websocket": ws_fail, "polling": poll_fail}
+        "successes": {"websocket": ws_succ, "polling": poll_succ, "change_feed": feed_succ},
+        "failures": {"websocket": ws_fail, "polling": poll_fail, "change_feed": feed_fail}
     }
 
     output_dir = os.path.join(os.path.dirname(__file__), '..', 'risultati-misurazioni')
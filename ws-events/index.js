@@ -8,6 +8,9 @@ const REDIS_URL = process.env.REDIS_URL || "redis://localhost:6379/0";
 const MAX_PAYLOAD = parseInt(process.env.WS_MAX_PAYLOAD || "1048576", 10);
 const ALLOWED_ORIGINS = (process.env.WS_ALLOWED_ORIGINS || "*").split(",");
 const MESSAGE_RATE_LIMIT = parseInt(process.env.WS_MESSAGE_RATE_LIMIT || "20", 10);
+// pubsub: canale 'events'; stream: Redis Stream scritto da api-rest con EVENTS_TRANSPORT=stream
+const EVENTS_TRANSPORT = process.env.EVENTS_TRANSPORT || "pubsub";
+const EVENTS_STREAM = process.env.EVENTS_STREAM || "events:stream";
 const logger = winston.createLogger({
   level: 'info',
   format: winston.format.combine(
@@ -104,7 +107,7 @@ function checkMessageRateLimit(connectionId) {
     process.exit(1);
   }
 
-  await sub.subscribe('events', (message) => {
+  const broadcast = (message) => {
     const traceId = `evt-${Date.now()}`;
     let eventData;
 
@@ -118,6 +121,7 @@ function checkMessageRateLimit(connectionId) {
     logger.info('Broadcasting event', {
       traceId,
       eventType: eventData.type,
+      changes: eventData.type === 'batch_update' ? (eventData.changes || []).length : undefined,
       clientCount: wss.clients.size,
     });
 
@@ -127,11 +131,41 @@ function checkMessageRateLimit(connectionId) {
         wsMessages.labels(eventData.type || 'unknown').inc();
       }
     });
-  });
+  };
 
-  logger.info("WebSocket server listening on 7070, subscribed to 'events'");
+  if (EVENTS_TRANSPORT === 'stream') {
+    logger.info(`WebSocket server listening on 7070, reading stream '${EVENTS_STREAM}'`);
+    await followStream(sub, broadcast);
+  } else {
+    await sub.subscribe('events', broadcast);
+    logger.info("WebSocket server listening on 7070, subscribed to 'events'");
+  }
 })();
 
+// Legge lo stream a blocchi (XREAD BLOCK). L'ultimo id ricevuto è conservato anche
+// dopo un errore: alla riconnessione a Redis non si perdono eventi.
+async function followStream(client, onMessage) {
+  let lastId = null;
+  while (true) {
+    try {
+      if (lastId === null) {
+        const [last] = await client.xRevRange(EVENTS_STREAM, '+', '-', { COUNT: 1 });
+        lastId = last ? last.id : '0-0';
+      }
+      const response = await client.xRead({ key: EVENTS_STREAM, id: lastId }, { BLOCK: 5000, COUNT: 100 });
+      for (const stream of response || []) {
+        for (const entry of stream.messages) {
+          lastId = entry.id;
+          onMessage(entry.message.data);
+        }
+      }
+    } catch (err) {
+      logger.error('Redis stream read error', { error: err.message, lastId });
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+    }
+  }
+}
+
 wss.on('connection', (ws, req) => {
   const connectionId = `conn-${Date.now()}-${Math.random().toString(36).substring(2, 11)}`;
   const user = req.user || { role: 'anonymous' };